@@ -3,14 +3,36 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import email.utils
+import gzip
+import hashlib
+import http.client
+import io
+import itertools
 import json
+import math
 import os
-import urllib.error
-import urllib.request
+import queue
+import random
+import select
+import signal
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from time import monotonic
+from typing import NamedTuple
+from urllib.parse import urlsplit
 from uuid import uuid4
 
 APP_DIR = Path(__file__).resolve().parent
@@ -21,6 +43,37 @@ KONG_PROXY_URL = os.environ.get(
 ).rstrip("/")
 KONG_HOST = os.environ.get("KONG_HOST", "api.internal.banklab.test")
 CARDS_API_KEY = os.environ.get("CARDS_API_KEY", "")
+OVERVIEW_API_KEY = os.environ.get("OVERVIEW_API_KEY", "")
+UPSTREAM_TIMEOUT_SECONDS = 5
+UPSTREAM_MAX_PER_HOST = int(os.environ.get("UPSTREAM_MAX_PER_HOST", "8"))
+UPSTREAM_IDLE_SECONDS = float(os.environ.get("UPSTREAM_IDLE_SECONDS", "30"))
+APP_ENGINE = os.environ.get("APP_ENGINE", "threading")
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("ASYNC_MAX_CONCURRENCY", "64"))
+CARDS_CACHE_TTL_SECONDS = float(os.environ.get("CARDS_CACHE_TTL_SECONDS", "0"))
+CARDS_CACHE_STALE_SECONDS = float(os.environ.get("CARDS_CACHE_STALE_SECONDS", "0"))
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "5"))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "10"))
+ADMISSION_LIMIT = int(os.environ.get("ADMISSION_LIMIT", "32"))
+ADMISSION_QUEUE_DEPTH = int(os.environ.get("ADMISSION_QUEUE_DEPTH", "64"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+OVERVIEW_CALL_TIMEOUT_SECONDS = float(os.environ.get("OVERVIEW_CALL_TIMEOUT_SECONDS", "2"))
+OVERVIEW_CACHE_TTL_SECONDS = float(os.environ.get("OVERVIEW_CACHE_TTL_SECONDS", "2"))
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", "16"))
+APP_WORKERS = int(os.environ.get("APP_WORKERS", "1"))
+WORKER_BACKOFF_SECONDS = float(os.environ.get("WORKER_BACKOFF_SECONDS", "0.5"))
+WORKER_MAX_BACKOFF_SECONDS = float(os.environ.get("WORKER_MAX_BACKOFF_SECONDS", "30"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9090"))
+DRAIN_SECONDS = float(os.environ.get("DRAIN_SECONDS", "10"))
+STATIC_RELOAD_SECONDS = float(os.environ.get("STATIC_RELOAD_SECONDS", "2"))
+# Outlive ingress-nginx's 60s upstream keepalive_timeout so nginx closes idle sockets first.
+KEEPALIVE_IDLE_SECONDS = float(os.environ.get("KEEPALIVE_IDLE_SECONDS", "75"))
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get("KEEPALIVE_MAX_REQUESTS", "1000"))
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", "128"))
+ACCESS_LOG_QUEUE = int(os.environ.get("ACCESS_LOG_QUEUE", "4096"))
+ACCESS_LOG_BATCH = int(os.environ.get("ACCESS_LOG_BATCH", "256"))
+ACCESS_LOG_SAMPLE_2XX = float(os.environ.get("ACCESS_LOG_SAMPLE_2XX", "1"))
 VISIBLE_HEADERS = (
     "x-banklab-correlation-id",
     "ratelimit-limit",
@@ -28,6 +81,18 @@ VISIBLE_HEADERS = (
     "x-kong-proxy-latency",
     "x-kong-upstream-latency",
 )
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+API_ROUTES = {"/api/cards": True, "/api/cards/without-key": False}
+OVERVIEW_ROUTE = "/api/overview"
+LOCAL_ROUTES = (OVERVIEW_ROUTE, "/ready", "/favicon.ico")
+OVERVIEW_APIS = (
+    ("accounts", "/accounts/v1/health"),
+    ("payments", "/payments/v1/health"),
+    ("cards", "/cards/v1/cards"),
+    ("customer-profile", "/customers/v1/health"),
+    ("fraud", "/fraud/v1/health"),
+)
 STATIC_FILES = {
     "/": ("index.html", "text/html; charset=utf-8"),
     "/index.html": ("index.html", "text/html; charset=utf-8"),
@@ -49,32 +114,455 @@ CONTENT_SECURITY_POLICY = "; ".join(
 )
 
 
-def call_cards(include_key: bool) -> dict:
-    request_id = f"customer-web-{uuid4()}"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+GAUGES = {"banklab_web_requests_in_flight", "banklab_web_workers"}
+METRIC_HELP = {
+    "banklab_web_requests_total": "Requests answered by route and status class.",
+    "banklab_web_request_duration_seconds": "Time to answer a request by route.",
+    "banklab_web_requests_in_flight": "Requests currently being answered by route.",
+    "banklab_web_requests_shed_total": "Requests rejected with 503 by admission control.",
+    "banklab_web_admission_queue_seconds": "Time requests waited for an admission slot.",
+    "banklab_web_upstream_responses_total": "Kong calls by API and status class.",
+    "banklab_web_workers": "Prefork worker processes that answered the metrics collection.",
+    "banklab_web_worker_restarts_total": "Prefork worker processes restarted after exiting.",
+    "banklab_web_access_log_dropped_total": "Access log lines dropped because the queue was full.",
+    "banklab_web_connections_shed_total": "Connections refused with 503 at the connection cap.",
+    "banklab_web_upstream_duration_seconds": (
+        "Kong call time split into total, Kong proxy and upstream API components."
+    ),
+}
+
+
+class MetricsRegistry:
+    """Counters, gauges and fixed-bucket histograms behind one short-held lock."""
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], int] = {}
+        self._histograms: dict[tuple[str, tuple], list] = {}
+
+    def inc(self, name: str, labels: tuple, amount: int = 1) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    [name, labels, value] for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    [name, labels, counts, total]
+                    for (name, labels), (counts, total) in self._histograms.items()
+                ],
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        """Add another registry's snapshot, e.g. one fetched from a prefork worker."""
+        for name, labels, value in snapshot["counters"]:
+            self.inc(name, tuple(map(tuple, labels)), value)
+        with self._lock:
+            for name, labels, counts, total in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                histogram = self._histograms.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+                histogram[0] = [
+                    mine + theirs for mine, theirs in zip(histogram[0], counts, strict=True)
+                ]
+                histogram[1] += total
+
+    def render_prometheus(self) -> bytes:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(counts), total) for key, (counts, total) in self._histograms.items()
+            }
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            kind = "gauge" if name in GAUGES else "counter"
+            lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} {kind}"]
+            for (_, labels), value in sorted(
+                item for item in counters.items() if item[0][0] == name
+            ):
+                lines.append(f"{name}{render_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for (_, labels), (counts, total) in sorted(
+                item for item in histograms.items() if item[0][0] == name
+            ):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else f"{bound:g}"
+                    lines.append(
+                        f"{name}_bucket{render_labels((*labels, ('le', le)))} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{render_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{render_labels(labels)} {cumulative}")
+        lines.append("")
+        return "\n".join(lines).encode()
+
+
+def render_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    rendered = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels
+    )
+    return f"{{{rendered}}}"
+
+
+def status_class(status: int | None) -> str:
+    return f"{status // 100}xx" if status else "error"
+
+
+def route_label(path: str) -> str:
+    """Bound label cardinality to the routes the server knows about."""
+    if path in STATIC_FILES or path in API_ROUTES or path in LOCAL_ROUTES:
+        return path
+    return "other"
+
+
+METRICS = MetricsRegistry(LATENCY_BUCKETS)
+
+
+def record_request(route: str, status: int | None, elapsed: float) -> None:
+    labels = (("route", route),)
+    METRICS.inc("banklab_web_requests_in_flight", labels, -1)
+    METRICS.inc("banklab_web_requests_total", (*labels, ("class", status_class(status))))
+    METRICS.observe("banklab_web_request_duration_seconds", labels, elapsed)
+
+
+def record_upstream(api: str, status: int | None, elapsed: float, headers=None) -> None:
+    labels = (("api", api),)
+    METRICS.inc("banklab_web_upstream_responses_total", (*labels, ("class", status_class(status))))
+    METRICS.observe(
+        "banklab_web_upstream_duration_seconds", (*labels, ("component", "total")), elapsed
+    )
+    for component, header in (
+        ("kong", "x-kong-proxy-latency"),
+        ("upstream", "x-kong-upstream-latency"),
+    ):
+        value = headers.get(header) if headers is not None else None
+        if value is not None and value.isdigit():
+            METRICS.observe(
+                "banklab_web_upstream_duration_seconds",
+                (*labels, ("component", component)),
+                int(value) / 1000,
+            )
+
+
+class ConnectionPool:
+    """Bounded, thread-safe keep-alive HTTP/1.1 connections per upstream host."""
+
+    def __init__(self, max_per_host: int, idle_seconds: float) -> None:
+        self.max_per_host = max(1, max_per_host)
+        self.idle_seconds = idle_seconds
+        self._condition = threading.Condition()
+        self._idle: dict[tuple[str, str, int], deque] = {}
+        self._open: dict[tuple[str, str, int], int] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "waiters": 0, "retries": 0}
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                **self._stats,
+                "open": sum(self._open.values()),
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
+
+    def request(
+        self, url: str, headers: dict, timeout: float
+    ) -> tuple[http.client.HTTPResponse, bytes]:
+        """GET `url`, with pool wait, connect, send and every read sharing one `timeout`."""
+        deadline = monotonic() + timeout
+        parts = urlsplit(url)
+        origin = (
+            parts.scheme,
+            parts.hostname or "",
+            parts.port or (443 if parts.scheme == "https" else 80),
+        )
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        retried = False
+        while True:
+            connection, reused = self._acquire(origin, deadline)
+            try:
+                self._arm(connection, deadline)
+                connection.request("GET", target, headers=headers)
+                self._arm(connection, deadline)
+                response = connection.getresponse()
+                body = self._read(connection, response, deadline)
+            except (ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+                self._release(origin, connection, reusable=False)
+                # A reused socket may have been reset by Kong; retry once on a fresh one.
+                if not reused or retried:
+                    raise
+                retried = True
+                with self._condition:
+                    self._stats["retries"] += 1
+                continue
+            except BaseException:
+                self._release(origin, connection, reusable=False)
+                raise
+            self._release(origin, connection, reusable=not response.will_close)
+            return response, body
+
+    @staticmethod
+    def _arm(connection: http.client.HTTPConnection, deadline: float) -> None:
+        """Give the next socket operation only the time left before `deadline`."""
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            raise TimeoutError("upstream request deadline exceeded")
+        connection.timeout = remaining
+        if connection.sock is not None:
+            connection.sock.settimeout(remaining)
+
+    def _read(
+        self,
+        connection: http.client.HTTPConnection,
+        response: http.client.HTTPResponse,
+        deadline: float,
+    ) -> bytes:
+        # read() would give every recv the full socket timeout; read1 lets each one
+        # have only what is left. The last read() of zero bytes closes the response
+        # so the connection can be reused.
+        chunks = []
+        while not response.isclosed():
+            self._arm(connection, deadline)
+            chunks.append(response.read1(65536) if response.length != 0 else response.read())
+        return b"".join(chunks)
+
+    def _acquire(
+        self, origin: tuple[str, str, int], deadline: float
+    ) -> tuple[http.client.HTTPConnection, bool]:
+        with self._condition:
+            idle = self._idle.setdefault(origin, deque())
+            while True:
+                self._evict_expired(origin, idle)
+                while idle:
+                    connection, _ = idle.pop()
+                    if self._is_stale(connection):
+                        self._discard(origin, connection)
+                        continue
+                    self._stats["hits"] += 1
+                    return connection, True
+                if self._open.get(origin, 0) < self.max_per_host:
+                    self._open[origin] = self._open.get(origin, 0) + 1
+                    self._stats["misses"] += 1
+                    break
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("upstream connection pool exhausted")
+                self._stats["waiters"] += 1
+                self._condition.wait(remaining)
+
+        scheme, host, port = origin
+        timeout = max(0.001, deadline - monotonic())
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def _release(
+        self, origin: tuple[str, str, int], connection: http.client.HTTPConnection, reusable: bool
+    ) -> None:
+        with self._condition:
+            if reusable and connection.sock is not None:
+                self._idle[origin].append((connection, monotonic()))
+            else:
+                connection.close()
+                self._open[origin] -= 1
+            self._condition.notify()
+
+    def _evict_expired(self, origin: tuple[str, str, int], idle: deque) -> None:
+        cutoff = monotonic() - self.idle_seconds
+        while idle and idle[0][1] < cutoff:
+            connection, _ = idle.popleft()
+            self._discard(origin, connection)
+
+    def _discard(
+        self, origin: tuple[str, str, int], connection: http.client.HTTPConnection
+    ) -> None:
+        connection.close()
+        self._open[origin] -= 1
+        self._stats["evictions"] += 1
+
+    @staticmethod
+    def _is_stale(connection: http.client.HTTPConnection) -> bool:
+        # An idle keep-alive socket that is readable has been closed by the peer.
+        if connection.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+
+UPSTREAM_POOL = ConnectionPool(UPSTREAM_MAX_PER_HOST, UPSTREAM_IDLE_SECONDS)
+
+
+class CircuitBreaker:
+    """Stop calling Kong after repeated failures and let one probe test recovery."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"trips": 0, "rejected": 0, "probes": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_after_seconds": self._retry_after(),
+            }
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "open" and monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = "half-open"
+            if self._state == "closed" or (self._state == "half-open" and not self._probing):
+                if self._state == "half-open":
+                    self._probing = True
+                    self._stats["probes"] += 1
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if success:
+                self._state = "closed"
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._state == "half-open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["trips"] += 1
+                self._state = "open"
+                self._opened_at = monotonic()
+
+    def _retry_after(self) -> int:
+        if self._state != "open":
+            return 0
+        return max(1, math.ceil(self.reset_seconds - (monotonic() - self._opened_at)))
+
+
+BREAKERS = {
+    api: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+    for api, _path in OVERVIEW_APIS
+}
+FANOUT_POOL = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+class _RecordedSocket:
+    """Let http.client parse a response that has already been read in full."""
+
+    def __init__(self, raw: bytes) -> None:
+        self._raw = raw
+
+    def makefile(self, *_args: object, **_kwargs: object) -> io.BytesIO:
+        return io.BytesIO(self._raw)
+
+
+async def fetch_async(
+    url: str, headers: dict, timeout: float
+) -> tuple[http.client.HTTPResponse, bytes]:
+    parts = urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    secure = parts.scheme == "https"
+
+    async def exchange() -> bytes:
+        reader, writer = await asyncio.open_connection(
+            parts.hostname,
+            parts.port or (443 if secure else 80),
+            ssl=ssl.create_default_context() if secure else None,
+        )
+        try:
+            lines = [f"GET {target} HTTP/1.1", *(f"{k}: {v}" for k, v in headers.items())]
+            writer.write(("\r\n".join([*lines, "Connection: close", "", ""])).encode("latin-1"))
+            await writer.drain()
+            return await reader.read()
+        finally:
+            writer.close()
+
+    raw = await asyncio.wait_for(exchange(), timeout)
+    response = http.client.HTTPResponse(_RecordedSocket(raw))
+    response.begin()
+    return response, response.read()
+
+
+class RawJSON(bytes):
+    """UTF-8 JSON from Kong that json_body splices into the envelope unchanged."""
+
+
+def passthrough_json(raw: bytes) -> RawJSON | None:
+    """Validate an upstream JSON body once so it can be forwarded without re-encoding."""
+    if json.detect_encoding(raw) != "utf-8":
+        return None
+    try:
+        json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return RawJSON(raw)
+
+
+def kong_headers(api_key: str | None) -> dict:
     headers = {
         "Host": KONG_HOST,
         "Accept": "application/json",
         "User-Agent": "banklab-customer-web",
-        "X-Request-ID": request_id,
+        "X-Request-ID": f"customer-web-{uuid4()}",
     }
-    if include_key:
-        headers["apikey"] = CARDS_API_KEY
+    if api_key is not None:
+        headers["apikey"] = api_key
+    return headers
 
-    request = urllib.request.Request(f"{KONG_PROXY_URL}/cards/v1/cards", headers=headers)
-    started = monotonic()
-    try:
-        response = urllib.request.urlopen(request, timeout=5)
-    except urllib.error.HTTPError as exc:
-        response = exc
-    except urllib.error.URLError as exc:
-        return {"ok": False, "message": str(exc.reason), "trace": {"request_id": request_id}}
 
-    body = response.read().decode("utf-8", errors="replace")
-    try:
-        data = json.loads(body)
-    except json.JSONDecodeError:
-        data = {"message": body.strip()}
+def upstream_failure(api: str, headers: dict, started: float, exc: BaseException) -> dict:
+    record_upstream(api, None, monotonic() - started)
+    message = str(exc) or type(exc).__name__
+    return {"ok": False, "message": message, "trace": {"request_id": headers["X-Request-ID"]}}
+
 
+def kong_result(
+    api: str,
+    headers: dict,
+    started: float,
+    response: http.client.HTTPResponse,
+    raw: bytes,
+    passthrough: bool,
+) -> dict:
+    data = passthrough_json(raw) if passthrough else None
+    if data is None:
+        body = raw.decode("utf-8", errors="replace")
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            data = {"message": body.strip()}
+
+    elapsed = monotonic() - started
+    record_upstream(api, response.status, elapsed, response.headers)
     trace_headers = {
         name: response.headers[name]
         for name in VISIBLE_HEADERS
@@ -82,62 +570,1152 @@ def call_cards(include_key: bool) -> dict:
     }
     return {
         "ok": response.status == HTTPStatus.OK,
-        "expected_rejection": not include_key
-        and response.status in {HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN},
         "data": data,
         "trace": {
             "status": response.status,
-            "request_id": request_id,
-            "elapsed_ms": round((monotonic() - started) * 1000),
+            "request_id": headers["X-Request-ID"],
+            "elapsed_ms": round(elapsed * 1000),
             "headers": trace_headers,
         },
     }
 
 
+def upstream_budget(api: str, headers: dict, deadline: float) -> tuple[float, dict | None]:
+    """Return the Kong timeout left in the request budget, or a fail-fast payload."""
+    remaining = min(UPSTREAM_TIMEOUT_SECONDS, deadline - monotonic())
+    trace = {"request_id": headers["X-Request-ID"]}
+    if remaining <= 0:
+        return 0, {"ok": False, "message": "request deadline exceeded", "trace": trace}
+    breaker = BREAKERS[api]
+    if not breaker.allow():
+        stats = breaker.stats()
+        return 0, {
+            "ok": False,
+            "message": f"Kong is failing; {api} calls are paused",
+            "trace": {
+                **trace,
+                "circuit": stats["state"],
+                "retry_after_seconds": stats["retry_after_seconds"],
+            },
+        }
+    return remaining, None
+
+
+def call_kong(
+    api: str, path: str, api_key: str | None, deadline: float, passthrough: bool = False
+) -> dict:
+    headers = kong_headers(api_key)
+    started = monotonic()
+    timeout, refusal = upstream_budget(api, headers, deadline)
+    if refusal is not None:
+        return refusal
+    try:
+        response, raw = UPSTREAM_POOL.request(f"{KONG_PROXY_URL}{path}", headers, timeout)
+    except (OSError, http.client.HTTPException) as exc:
+        BREAKERS[api].record(success=False)
+        return upstream_failure(api, headers, started, exc)
+    BREAKERS[api].record(success=response.status < HTTPStatus.INTERNAL_SERVER_ERROR)
+    return kong_result(api, headers, started, response, raw, passthrough)
+
+
+async def call_kong_async(
+    api: str, path: str, api_key: str | None, deadline: float, passthrough: bool = False
+) -> dict:
+    headers = kong_headers(api_key)
+    started = monotonic()
+    timeout, refusal = upstream_budget(api, headers, deadline)
+    if refusal is not None:
+        return refusal
+    try:
+        response, raw = await fetch_async(f"{KONG_PROXY_URL}{path}", headers, timeout)
+    except (OSError, http.client.HTTPException, asyncio.TimeoutError) as exc:
+        BREAKERS[api].record(success=False)
+        return upstream_failure(api, headers, started, exc)
+    BREAKERS[api].record(success=response.status < HTTPStatus.INTERNAL_SERVER_ERROR)
+    return kong_result(api, headers, started, response, raw, passthrough)
+
+
+def card_outcome(result: dict, include_key: bool) -> dict:
+    status = result["trace"].get("status")
+    if status is None:
+        return result
+    rejected = status in {HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN}
+    return {**result, "expected_rejection": not include_key and rejected}
+
+
+def call_cards(include_key: bool, deadline: float | None = None) -> dict:
+    if deadline is None:
+        deadline = monotonic() + REQUEST_DEADLINE_SECONDS
+    api_key = CARDS_API_KEY if include_key else None
+    result = call_kong("cards", "/cards/v1/cards", api_key, deadline, passthrough=True)
+    return card_outcome(result, include_key)
+
+
+async def call_cards_async(include_key: bool, deadline: float | None = None) -> dict:
+    if deadline is None:
+        deadline = monotonic() + REQUEST_DEADLINE_SECONDS
+    api_key = CARDS_API_KEY if include_key else None
+    result = await call_kong_async("cards", "/cards/v1/cards", api_key, deadline, passthrough=True)
+    return card_outcome(result, include_key)
+
+
+def overview_calls(deadline: float) -> list[tuple[str, str, str | None, float]]:
+    """Give every domain its own timeout, capped by the request deadline.
+
+    All calls use the customer-web-overview consumer, so the overview spends its
+    own rate-limit budget rather than the synthetic clients'.
+    """
+    call_deadline = min(deadline, monotonic() + OVERVIEW_CALL_TIMEOUT_SECONDS)
+    return [(api, path, OVERVIEW_API_KEY or None, call_deadline) for api, path in OVERVIEW_APIS]
+
+
+def overview_summary(results: list[dict], started: float) -> dict:
+    ok = [result["ok"] for result in results]
+    return {
+        "ok": all(ok),
+        "partial": any(ok) and not all(ok),
+        "elapsed_ms": round((monotonic() - started) * 1000),
+        "apis": {api: result for (api, _path), result in zip(OVERVIEW_APIS, results, strict=True)},
+    }
+
+
+def overview(deadline: float) -> dict:
+    started = monotonic()
+    futures = [FANOUT_POOL.submit(call_kong, *call) for call in overview_calls(deadline)]
+    return overview_summary([future.result() for future in futures], started)
+
+
+async def overview_async(deadline: float) -> dict:
+    started = monotonic()
+    results = await asyncio.gather(*(call_kong_async(*call) for call in overview_calls(deadline)))
+    return overview_summary(list(results), started)
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: dict = {}
+
+
+def kong_answered(result: dict) -> bool:
+    """Only cache answers Kong actually gave; transport failures and 5xx are retried."""
+    status = result.get("trace", {}).get("status")
+    return status is not None and status < HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def overview_answered(result: dict) -> bool:
+    apis = result.get("apis")
+    return bool(apis) and all(kong_answered(api_result) for api_result in apis.values())
+
+
+class ResponseCoalescer:
+    """Share one in-flight upstream call per key and keep results for a short TTL."""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        stale_seconds: float,
+        cacheable: Callable[[dict], bool] = kong_answered,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.cacheable = cacheable
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, tuple[float, dict]] = {}
+        self._inflight: dict[tuple, _Flight] = {}
+        self._async_inflight: dict[tuple, asyncio.Future] = {}
+        self._refreshes: set[asyncio.Task] = set()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
+
+    def get(self, key: tuple, load: Callable[[], dict]) -> dict:
+        with self._lock:
+            cached, refresh = self._lookup(key)
+            if cached is not None:
+                if refresh and key not in self._inflight:
+                    flight = self._inflight[key] = _Flight()
+                    threading.Thread(
+                        target=self._lead, args=(key, load, flight), daemon=True
+                    ).start()
+                return cached
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if leader:
+            return self._mark(self._lead(key, load, flight), "miss")
+        flight.done.wait()
+        return self._mark(flight.result, "coalesced")
+
+    async def get_async(self, key: tuple, load: Callable[[], Awaitable[dict]]) -> dict:
+        with self._lock:
+            cached, refresh = self._lookup(key)
+            if cached is not None:
+                if refresh and key not in self._async_inflight:
+                    flight = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                    task = asyncio.create_task(self._lead_async(key, load, flight))
+                    self._refreshes.add(task)
+                    task.add_done_callback(self._refreshes.discard)
+                return cached
+            flight = self._async_inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if leader:
+            return self._mark(await self._lead_async(key, load, flight), "miss")
+        return self._mark(await asyncio.shield(flight), "coalesced")
+
+    def _lookup(self, key: tuple) -> tuple[dict | None, bool]:
+        """Return a fresh or stale cached result and whether it needs a refresh."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        age = monotonic() - entry[0]
+        if age < self.ttl_seconds:
+            self._stats["hits"] += 1
+            return self._mark(entry[1], "hit"), False
+        if age < self.ttl_seconds + self.stale_seconds:
+            self._stats["stale"] += 1
+            return self._mark(entry[1], "stale"), True
+        del self._entries[key]
+        return None, False
+
+    def _lead(self, key: tuple, load: Callable[[], dict], flight: _Flight) -> dict:
+        try:
+            flight.result = load()
+        except Exception as exc:  # noqa: BLE001 - followers report the leader's failure
+            flight.result = self._failure(exc)
+        with self._lock:
+            self._store(key, flight.result)
+            del self._inflight[key]
+        flight.done.set()
+        return flight.result
+
+    async def _lead_async(
+        self, key: tuple, load: Callable[[], Awaitable[dict]], flight: asyncio.Future
+    ) -> dict:
+        try:
+            result = await load()
+        except Exception as exc:  # noqa: BLE001 - followers report the leader's failure
+            result = self._failure(exc)
+        with self._lock:
+            self._store(key, result)
+            del self._async_inflight[key]
+        flight.set_result(result)
+        return result
+
+    def _store(self, key: tuple, result: dict) -> None:
+        if self.ttl_seconds > 0 and self.cacheable(result):
+            self._entries[key] = (monotonic(), result)
+
+    @staticmethod
+    def _failure(exc: Exception) -> dict:
+        return {"ok": False, "message": str(exc) or type(exc).__name__, "trace": {}}
+
+    @staticmethod
+    def _mark(result: dict, cache: str) -> dict:
+        return {**result, "trace": {**result.get("trace", {}), "cache": cache}}
+
+
+CARDS_CACHE = ResponseCoalescer(CARDS_CACHE_TTL_SECONDS, CARDS_CACHE_STALE_SECONDS)
+# /api/overview is public and costs five Kong calls, so it is always coalesced and cached.
+OVERVIEW_CACHE = ResponseCoalescer(OVERVIEW_CACHE_TTL_SECONDS, 0, overview_answered)
+
+
+def serve_cards(path: str, deadline: float) -> dict:
+    include_key = API_ROUTES[path]
+    return CARDS_CACHE.get((path, include_key), lambda: call_cards(include_key, deadline))
+
+
+async def serve_cards_async(path: str, deadline: float) -> dict:
+    include_key = API_ROUTES[path]
+    return await CARDS_CACHE.get_async(
+        (path, include_key), lambda: call_cards_async(include_key, deadline)
+    )
+
+
+def serve_overview(deadline: float) -> dict:
+    return OVERVIEW_CACHE.get((OVERVIEW_ROUTE,), lambda: overview(deadline))
+
+
+async def serve_overview_async(deadline: float) -> dict:
+    return await OVERVIEW_CACHE.get_async((OVERVIEW_ROUTE,), lambda: overview_async(deadline))
+
+
+def json_body(payload: dict) -> bytes:
+    data = payload.get("data")
+    if not isinstance(data, RawJSON):
+        return json.dumps(payload).encode()
+    envelope = json.dumps({key: value for key, value in payload.items() if key != "data"})
+    separator = ", " if len(envelope) > 2 else ""
+    return b"".join((envelope[:-1].encode(), separator.encode(), b'"data": ', data, b"}"))
+
+
+def response_headers(
+    content_type: str,
+    length: int | None,
+    cache_control: str = "no-store",
+    extra: tuple[tuple[str, str], ...] = (),
+) -> list[tuple[str, str]]:
+    headers = [
+        ("Content-Type", content_type),
+        ("Cache-Control", cache_control),
+        ("Content-Security-Policy", CONTENT_SECURITY_POLICY),
+        ("Referrer-Policy", "no-referrer"),
+        ("X-Content-Type-Options", "nosniff"),
+        ("X-Frame-Options", "DENY"),
+        *extra,
+    ]
+    if length is not None:
+        headers.append(("Content-Length", str(length)))
+    return headers
+
+
+class StaticAsset(NamedTuple):
+    content_type: str
+    variants: dict[str, tuple[str, bytes]]
+
+
+class StaticCache:
+    """Immutable in-memory copy of STATIC_FILES that reloads when the ConfigMap changes."""
+
+    def __init__(self, app_dir: Path, files: dict, check_seconds: float) -> None:
+        self.app_dir = app_dir
+        self.files = files
+        self.check_seconds = check_seconds
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._checked = monotonic()
+        self._signature, self._assets = self._load()
+
+    def get(self, path: str) -> StaticAsset | None:
+        if monotonic() - self._checked >= self.check_seconds and self._reload_lock.acquire(
+            blocking=False
+        ):
+            try:
+                self._checked = monotonic()
+                if self._stat() != self._signature:
+                    self._signature, self._assets = self._load()
+                    self.reloads += 1
+            except OSError:
+                pass
+            finally:
+                self._reload_lock.release()
+        return self._assets.get(path)
+
+    def _stat(self) -> tuple:
+        # ConfigMap updates swap the ..data symlink, so the followed inode changes.
+        return tuple(
+            (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            for stat in (
+                (self.app_dir / filename).stat()
+                for filename in sorted({filename for filename, _ in self.files.values()})
+            )
+        )
+
+    def _load(self) -> tuple[tuple, dict[str, StaticAsset]]:
+        signature = self._stat()
+        variants: dict[str, dict[str, tuple[str, bytes]]] = {}
+        assets = {}
+        for path, (filename, content_type) in self.files.items():
+            if filename not in variants:
+                body = (self.app_dir / filename).read_bytes()
+                tag = hashlib.sha256(body).hexdigest()[:32]
+                variants[filename] = {"identity": (f'"{tag}"', body)}
+                compressed = gzip.compress(body, compresslevel=9, mtime=0)
+                if len(compressed) < len(body):
+                    variants[filename]["gzip"] = (f'"{tag}-gzip"', compressed)
+            assets[path] = StaticAsset(content_type, variants[filename])
+        return signature, assets
+
+
+STATIC_CACHE = StaticCache(APP_DIR, STATIC_FILES, STATIC_RELOAD_SECONDS)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    allowed = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, param = item.partition(";")
+        param = param.strip()
+        quality = 1.0
+        if param.startswith("q="):
+            try:
+                quality = float(param[2:])
+            except ValueError:
+                quality = 0.0
+        allowed[coding.strip()] = quality > 0
+    return allowed.get("gzip", allowed.get("*", False))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def static_response(asset: StaticAsset, request_headers) -> tuple[int, list, bytes]:
+    encoding = (
+        "gzip"
+        if "gzip" in asset.variants and accepts_gzip(request_headers.get("Accept-Encoding", ""))
+        else "identity"
+    )
+    etag, body = asset.variants[encoding]
+    extra = (("ETag", etag), ("Vary", "Accept-Encoding"))
+    if encoding != "identity":
+        extra += (("Content-Encoding", encoding),)
+    if etag_matches(request_headers.get("If-None-Match", ""), etag):
+        headers = response_headers(asset.content_type, None, "no-cache", extra)
+        return HTTPStatus.NOT_MODIFIED, headers, b""
+    return HTTPStatus.OK, response_headers(asset.content_type, len(body), "no-cache", extra), body
+
+
+def local_response(path: str, request_headers) -> tuple[int, list, bytes]:
+    """Answer every route that does not call Kong."""
+    asset = STATIC_CACHE.get(path)
+    if asset is not None:
+        return static_response(asset, request_headers)
+    if path == "/ready":
+        status = HTTPStatus.OK if CARDS_API_KEY else HTTPStatus.SERVICE_UNAVAILABLE
+        return json_response(status, {"ready": bool(CARDS_API_KEY)})
+    if path == "/favicon.ico":
+        return HTTPStatus.NO_CONTENT, response_headers("image/x-icon", 0), b""
+    return json_response(HTTPStatus.NOT_FOUND, {"error": "not-found"})
+
+
+def upstream_stats() -> dict:
+    return {
+        "pool": UPSTREAM_POOL.stats(),
+        "cards_cache": CARDS_CACHE.stats(),
+        "overview_cache": OVERVIEW_CACHE.stats(),
+        "circuits": {api: breaker.stats() for api, breaker in BREAKERS.items()},
+    }
+
+
+def json_response(status: int, payload: dict) -> tuple[int, list, bytes]:
+    body = json_body(payload)
+    return status, response_headers(JSON_CONTENT_TYPE, len(body)), body
+
+
+class AdmissionController:
+    """Bound concurrent requests, queue a few, and shed the rest with 503.
+
+    Static assets and /ready are priority requests: when a slot frees up they
+    are admitted before any queued /api/* call.
+    """
+
+    def __init__(self, limit: int, queue_depth: int, queue_timeout: float) -> None:
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = {True: 0, False: 0}
+
+    def enter(self, route: str, priority: bool) -> bool:
+        if self.limit <= 0:
+            return True
+        started = monotonic()
+        with self._condition:
+            admitted = self._admissible(priority)
+            if not admitted and sum(self._waiting.values()) < self.queue_depth:
+                self._waiting[priority] += 1
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self._admissible(priority), self.queue_timeout
+                    )
+                finally:
+                    self._waiting[priority] -= 1
+            if admitted:
+                self._active += 1
+            else:
+                self._condition.notify_all()
+        labels = (("class", "priority" if priority else "api"),)
+        METRICS.observe("banklab_web_admission_queue_seconds", labels, monotonic() - started)
+        if not admitted:
+            METRICS.inc("banklab_web_requests_shed_total", (("route", route),))
+        return admitted
+
+    def leave(self) -> None:
+        if self.limit <= 0:
+            return
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _admissible(self, priority: bool) -> bool:
+        return self._active < self.limit and (priority or not self._waiting[True])
+
+
+ADMISSION = AdmissionController(
+    ADMISSION_LIMIT, ADMISSION_QUEUE_DEPTH, ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+
+
+def shed_response() -> tuple[int, list, bytes]:
+    body = json_body({"error": "overloaded"})
+    headers = response_headers(
+        JSON_CONTENT_TYPE, len(body), extra=(("Retry-After", str(ADMISSION_RETRY_AFTER_SECONDS)),)
+    )
+    return HTTPStatus.SERVICE_UNAVAILABLE, headers, body
+
+
+class AccessLog:
+    """JSON access log written in batches by a background thread.
+
+    Request threads only enqueue. When the queue is full the line is dropped and
+    counted, so a slow stdout consumer never holds up a reply. 2xx lines are
+    sampled at `sample_2xx`; everything else is always kept.
+    """
+
+    def __init__(self, capacity: int, batch_size: int, sample_2xx: float, stream=None) -> None:
+        self.batch_size = max(1, batch_size)
+        self.sample_2xx = sample_2xx
+        self._stream = stream
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, capacity))
+        self._lock = threading.Lock()
+        self._writer: threading.Thread | None = None
+
+    def log(self, record: dict, event: str = "access") -> None:
+        if status_class(record.get("status")) == "2xx" and random.random() >= self.sample_2xx:
+            return
+        self._start()
+        try:
+            self._queue.put_nowait({"event": event, **record})
+        except queue.Full:
+            METRICS.inc("banklab_web_access_log_dropped_total", ())
+
+    def _start(self) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, daemon=True)
+                self._writer.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch
+            self._write([record for record in batch if record is not None])
+            if done:
+                return
+
+    def _write(self, batch: list[dict]) -> None:
+        if not batch:
+            return
+        stream = self._stream or sys.stdout
+        stream.write("".join(json.dumps(line, separators=(",", ":")) + "\n" for line in batch))
+        stream.flush()
+
+    def close(self, timeout: float = 2) -> None:
+        """Write out queued lines before the process exits."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        with contextlib.suppress(queue.Full):
+            self._queue.put(None, timeout=timeout)
+        writer.join(timeout)
+
+
+ACCESS_LOG = AccessLog(ACCESS_LOG_QUEUE, ACCESS_LOG_BATCH, ACCESS_LOG_SAMPLE_2XX)
+
+
+def access_record(
+    method: str, path: str, status: int | None, started: float | None, size: int | None, remote
+) -> dict:
+    return {
+        "method": method,
+        "path": path,
+        "status": int(status) if status else None,
+        "ms": round((monotonic() - started) * 1000, 3) if started is not None else None,
+        "bytes": size,
+        "remote": remote[0] if remote else None,
+    }
+
+
+def ends_connection(request_headers, served: int, draining: bool) -> bool:
+    """Decide whether a reply must carry Connection: close on a kept-alive connection.
+
+    GET and HEAD bodies are never read, so a request that declares one would leave
+    bytes in the stream that the next request parse would trip over.
+    """
+    return (
+        served >= KEEPALIVE_MAX_REQUESTS
+        or draining
+        or request_headers.get("Content-Length", "0").strip() != "0"
+        or "Transfer-Encoding" in request_headers
+    )
+
+
+def client_wants_close(version: str, request_headers) -> bool:
+    """Mirror BaseHTTPRequestHandler.parse_request's persistent connection rules."""
+    connection = request_headers.get("Connection", "").lower()
+    if connection == "close":
+        return True
+    if connection == "keep-alive":
+        return False
+    return version < "HTTP/1.1"
+
+
 class Handler(BaseHTTPRequestHandler):
     server_version = "banklab-customer-web"
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_IDLE_SECONDS
+    # Headers and body are separate writes; with Nagle on, a kept-alive connection waits
+    # for the client's delayed ACK before the body leaves.
+    disable_nagle_algorithm = True
+    started: float | None = None
 
     def log_message(self, fmt: str, *args: object) -> None:
-        print(fmt % args, flush=True)
+        ACCESS_LOG.log({"message": fmt % args}, event="error")
+
+    def log_request(self, code: int | str = "-", size: int | str = "-") -> None:
+        # do_GET logs its own line with the duration once the body is written; this
+        # covers send_error replies that never reach it.
+        if self.started is None:
+            status = code if isinstance(code, int) else None
+            path = getattr(self, "path", None)
+            ACCESS_LOG.log(
+                access_record(self.command, path, status, None, None, self.client_address)
+            )
+
+    def handle(self) -> None:
+        self.requests_served = 0
+        self.mark_idle(True)
+        try:
+            super().handle()
+        finally:
+            self.mark_idle(False)
+
+    def mark_idle(self, idle: bool) -> None:
+        if isinstance(self.server, DrainingHTTPServer):
+            self.server.mark_idle(self.connection, idle)
 
     def send_bytes(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_reply(status, response_headers(content_type, len(body)), body)
+
+    def send_reply(self, status: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        self.sent_status = status
+        self.sent_bytes = 0 if self.command == "HEAD" else len(body)
+        self.requests_served += 1
+        draining = isinstance(self.server, DrainingHTTPServer) and self.server.draining
         self.send_response(status)
-        self.send_header("Content-Type", content_type)
-        self.send_header("Cache-Control", "no-store")
-        self.send_header("Content-Security-Policy", CONTENT_SECURITY_POLICY)
-        self.send_header("Referrer-Policy", "no-referrer")
-        self.send_header("X-Content-Type-Options", "nosniff")
-        self.send_header("X-Frame-Options", "DENY")
-        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        if not self.close_connection and ends_connection(
+            self.headers, self.requests_served, draining
+        ):
+            self.send_header("Connection", "close")
         self.end_headers()
         if self.command != "HEAD":
             self.wfile.write(body)
 
     def send_json(self, status: int, payload: dict) -> None:
-        self.send_bytes(status, "application/json; charset=utf-8", json.dumps(payload).encode())
+        self.send_reply(*json_response(status, payload))
 
     def do_HEAD(self) -> None:
         self.do_GET()
 
     def do_GET(self) -> None:
-        if self.path in STATIC_FILES:
-            filename, content_type = STATIC_FILES[self.path]
-            self.send_bytes(HTTPStatus.OK, content_type, (APP_DIR / filename).read_bytes())
-        elif self.path == "/ready":
-            self.send_json(
-                HTTPStatus.OK if CARDS_API_KEY else HTTPStatus.SERVICE_UNAVAILABLE,
-                {"ready": bool(CARDS_API_KEY)},
+        route = route_label(self.path)
+        started = monotonic()
+        self.sent_status = self.sent_bytes = None
+        self.started = started
+        self.mark_idle(False)
+        METRICS.inc("banklab_web_requests_in_flight", (("route", route),))
+        try:
+            if not ADMISSION.enter(route, priority=not self.path.startswith("/api/")):
+                self.send_reply(*shed_response())
+                return
+            try:
+                deadline = started + REQUEST_DEADLINE_SECONDS
+                if self.path in API_ROUTES:
+                    self.send_json(HTTPStatus.OK, serve_cards(self.path, deadline))
+                elif self.path == OVERVIEW_ROUTE:
+                    self.send_json(HTTPStatus.OK, serve_overview(deadline))
+                else:
+                    self.send_reply(*local_response(self.path, self.headers))
+            finally:
+                ADMISSION.leave()
+        finally:
+            record_request(route, self.sent_status, monotonic() - started)
+            ACCESS_LOG.log(
+                access_record(
+                    self.command,
+                    self.path,
+                    self.sent_status,
+                    started,
+                    self.sent_bytes,
+                    self.client_address,
+                )
             )
-        elif self.path == "/api/cards":
-            self.send_json(HTTPStatus.OK, call_cards(include_key=True))
-        elif self.path == "/api/cards/without-key":
-            self.send_json(HTTPStatus.OK, call_cards(include_key=False))
-        elif self.path == "/favicon.ico":
-            self.send_bytes(HTTPStatus.NO_CONTENT, "image/x-icon", b"")
+            self.started = None
+            self.mark_idle(not self.close_connection)
+
+
+class AsyncServer:
+    """Serve the same routes as Handler from one event loop with a concurrency cap."""
+
+    max_request_bytes = 65536
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._idle: set[asyncio.StreamWriter] = set()
+        self.draining = False
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        served = 0
+        try:
+            while not self.draining:
+                self._idle.add(writer)
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEPALIVE_IDLE_SECONDS
+                    )
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, TimeoutError):
+                    return
+                finally:
+                    self._idle.discard(writer)
+                served += 1
+                if not await self.exchange(head, served, writer):
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def exchange(self, head: bytes, served: int, writer: asyncio.StreamWriter) -> bool:
+        """Answer one request and report whether the connection stays open."""
+        async with self._slots:
+            started = monotonic()
+            first_line, _, header_block = head.partition(b"\r\n")
+            request_line = first_line.decode("latin-1")
+            words = request_line.split()
+            request_headers = http.client.parse_headers(io.BytesIO(header_block))
+            if len(words) != 3 or words[0] not in {"GET", "HEAD"}:
+                status, headers, body = json_response(
+                    HTTPStatus.NOT_IMPLEMENTED, {"error": "unsupported-method"}
+                )
+                headers.append(("Connection", "close"))
+                writer.write(self.render(status, headers, body, head_only=False))
+                keep_open = False
+                method = words[0] if words else None
+                path, size = None, len(body)
+            else:
+                method, path, version = words
+                status, headers, body = await self.respond(path, request_headers)
+                keep_open = not client_wants_close(version, request_headers)
+                if keep_open and ends_connection(request_headers, served, self.draining):
+                    headers.append(("Connection", "close"))
+                    keep_open = False
+                writer.write(self.render(status, headers, body, method == "HEAD"))
+                size = 0 if method == "HEAD" else len(body)
+            await writer.drain()
+        remote = writer.get_extra_info("peername")
+        ACCESS_LOG.log(access_record(method, path, status, started, size, remote))
+        return keep_open
+
+    @staticmethod
+    async def respond(path: str, request_headers) -> tuple[int, list, bytes]:
+        route = route_label(path)
+        started = monotonic()
+        status = None
+        METRICS.inc("banklab_web_requests_in_flight", (("route", route),))
+        try:
+            deadline = started + REQUEST_DEADLINE_SECONDS
+            if path in API_ROUTES:
+                status, headers, body = json_response(
+                    HTTPStatus.OK, await serve_cards_async(path, deadline)
+                )
+            elif path == OVERVIEW_ROUTE:
+                status, headers, body = json_response(
+                    HTTPStatus.OK, await serve_overview_async(deadline)
+                )
+            else:
+                status, headers, body = local_response(path, request_headers)
+            return status, headers, body
+        finally:
+            record_request(route, status, monotonic() - started)
+
+    @staticmethod
+    def render(status: int, headers: list[tuple[str, str]], body: bytes, head_only: bool) -> bytes:
+        """Build the exact bytes BaseHTTPRequestHandler writes for Handler.send_reply."""
+        lines = [
+            f"{Handler.protocol_version} {int(status)} {HTTPStatus(status).phrase}",
+            f"Server: {Handler.server_version} {Handler.sys_version}",
+            f"Date: {email.utils.formatdate(usegmt=True)}",
+            *(f"{name}: {value}" for name, value in headers),
+            "",
+            "",
+        ]
+        head = "\r\n".join(lines).encode("latin-1", "strict")
+        return head if head_only else head + body
+
+    async def serve(self, host: str, port: int, reuse_port: bool, control_fd: int | None) -> None:
+        server = await asyncio.start_server(
+            self.handle, host, port, limit=self.max_request_bytes, reuse_port=reuse_port or None
+        )
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+        if control_fd is not None:
+            threading.Thread(
+                target=serve_control,
+                args=(control_fd, lambda: loop.call_soon_threadsafe(stopping.set)),
+                daemon=True,
+            ).start()
+        await stopping.wait()
+        server.close()
+        self.draining = True
+        for writer in list(self._idle):
+            writer.close()
+        # Let requests that were already accepted finish before the process exits.
+        active = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if active:
+            await asyncio.wait(active, timeout=DRAIN_SECONDS)
+
+
+class DrainingHTTPServer(ThreadingHTTPServer):
+    """Threaded server whose close waits for in-flight requests instead of dropping them.
+
+    Kept-alive connections that are parked between requests would otherwise hold
+    server_close for a whole idle timeout, so closing shuts their read side and busy
+    connections answer their current request with Connection: close.
+
+    Every connection holds a thread, so at most `max_connections` are served at
+    once. At the cap a parked connection is closed to make room; if none is
+    parked, the new connection gets 503 and is closed.
+    """
+
+    daemon_threads = False
+
+    def __init__(self, *args, max_connections: int = MAX_CONNECTIONS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.draining = False
+        self._idle: set[socket.socket] = set()
+        self._idle_lock = threading.Lock()
+        self._connections = threading.BoundedSemaphore(max(1, max_connections))
+
+    def process_request(self, request: socket.socket, client_address) -> None:
+        if not self._connections.acquire(blocking=False) and not self._make_room():
+            METRICS.inc("banklab_web_connections_shed_total", ())
+            self.shed(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._connections.release()
+            raise
+
+    def process_request_thread(self, request: socket.socket, client_address) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._connections.release()
+
+    def _make_room(self) -> bool:
+        """Close one parked keep-alive connection and wait briefly for its slot."""
+        with self._idle_lock:
+            if not self._idle:
+                return False
+            connection = self._idle.pop()
+        with contextlib.suppress(OSError):
+            connection.shutdown(socket.SHUT_RD)
+        return self._connections.acquire(timeout=0.1)
+
+    def shed(self, request: socket.socket) -> None:
+        status, headers, body = shed_response()
+        reply = AsyncServer.render(status, [*headers, ("Connection", "close")], body, False)
+        with contextlib.suppress(OSError):
+            request.settimeout(0.1)
+            request.sendall(reply)
+        self.shutdown_request(request)
+
+    def mark_idle(self, connection: socket.socket, idle: bool) -> None:
+        with self._idle_lock:
+            if not idle:
+                self._idle.discard(connection)
+                return
+            if not self.draining:
+                self._idle.add(connection)
+                return
+        with contextlib.suppress(OSError):
+            connection.shutdown(socket.SHUT_RD)
+
+    def server_close(self) -> None:
+        with self._idle_lock:
+            self.draining = True
+            idle, self._idle = self._idle, set()
+        for connection in idle:
+            with contextlib.suppress(OSError):
+                connection.shutdown(socket.SHUT_RD)
+        super().server_close()
+
+
+def serve_control(fd: int, stop: Callable[[], None]) -> None:
+    """Answer prefork supervisor requests until the supervisor goes away."""
+    answers = {b"metrics": METRICS.snapshot, b"upstream": upstream_stats}
+    with socket.socket(fileno=fd) as control, control.makefile("rwb") as stream:
+        for line in stream:
+            request_id, _, command = line.strip().partition(b" ")
+            answer = answers.get(command)
+            if answer is not None:
+                stream.write(request_id + b" " + json.dumps(answer()).encode() + b"\n")
+                stream.flush()
+    stop()
+
+
+class AdminHandler(Handler):
+    """Serve /metrics and /debug/upstream on METRICS_PORT, away from the public app port."""
+
+    metrics = staticmethod(METRICS.render_prometheus)
+    upstream = staticmethod(upstream_stats)
+
+    def log_request(self, code: int | str = "-", size: int | str = "-") -> None:
+        # Scrapes and debug reads are not customer traffic; keep them out of the access log.
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self.send_bytes(HTTPStatus.OK, METRICS_CONTENT_TYPE, self.metrics())
+        elif self.path == "/debug/upstream":
+            self.send_json(HTTPStatus.OK, self.upstream())
         else:
             self.send_json(HTTPStatus.NOT_FOUND, {"error": "not-found"})
 
 
+def serve_admin(
+    port: int, metrics: Callable[[], bytes], upstream: Callable[[], dict]
+) -> ThreadingHTTPServer:
+    AdminHandler.metrics = staticmethod(metrics)
+    AdminHandler.upstream = staticmethod(upstream)
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), AdminHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def serve(reuse_port: bool = False, control_fd: int | None = None) -> None:
+    # Prefork workers report through the supervisor, which owns METRICS_PORT.
+    admin = (
+        serve_admin(METRICS_PORT, METRICS.render_prometheus, upstream_stats)
+        if control_fd is None
+        else None
+    )
+    if APP_ENGINE == "asyncio":
+        engine = AsyncServer(ASYNC_MAX_CONCURRENCY)
+        asyncio.run(engine.serve("0.0.0.0", APP_PORT, reuse_port, control_fd))
+    else:
+        serve_threaded(reuse_port, control_fd)
+    if admin is not None:
+        admin.shutdown()
+    ACCESS_LOG.close()
+
+
+def serve_threaded(reuse_port: bool, control_fd: int | None) -> None:
+    httpd = DrainingHTTPServer(("0.0.0.0", APP_PORT), Handler, bind_and_activate=False)
+    httpd.allow_reuse_port = reuse_port
+    httpd.server_bind()
+    httpd.server_activate()
+
+    def stop(*_args: object) -> None:
+        # shutdown() blocks until serve_forever returns, so it cannot run on that thread.
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    if control_fd is not None:
+        threading.Thread(target=serve_control, args=(control_fd, stop), daemon=True).start()
+    httpd.serve_forever()
+    httpd.server_close()
+
+
+class WorkerProcess(NamedTuple):
+    process: subprocess.Popen
+    control: socket.socket
+    # Bytes read past the end of the last reply.
+    pending: bytearray
+    # One control exchange at a time per worker; concurrent scrapes would interleave lines.
+    lock: threading.Lock
+    started: float
+
+
+class Supervisor:
+    """Run APP_WORKERS server processes on one SO_REUSEPORT port and restart crashes.
+
+    A worker that exits soon after it started is restarted after an exponential
+    backoff, so a worker that cannot bind its port does not turn into a fork loop.
+    Control requests carry an id, so a reply that arrives after its request timed
+    out is dropped instead of being taken as the answer to the next one.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        drain_seconds: float,
+        backoff_seconds: float = WORKER_BACKOFF_SECONDS,
+        max_backoff_seconds: float = WORKER_MAX_BACKOFF_SECONDS,
+        control_timeout_seconds: float = 2.0,
+    ) -> None:
+        self.count = workers
+        self.drain_seconds = drain_seconds
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.control_timeout_seconds = control_timeout_seconds
+        self.restarts = 0
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._workers: dict[int, WorkerProcess] = {}
+        self._failures: dict[int, int] = {}
+        self._restart_at: dict[int, float] = {}
+        self._requests = itertools.count(1)
+
+    def spawn(self, index: int) -> None:
+        parent, child = socket.socketpair()
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve())],
+            env={**os.environ, "APP_CONTROL_FD": str(child.fileno())},
+            pass_fds=(child.fileno(),),
+        )
+        child.close()
+        self._workers[index] = WorkerProcess(
+            process, parent, bytearray(), threading.Lock(), monotonic()
+        )
+        log_event("worker-started", index=index, pid=process.pid)
+
+    def ask(self, command: bytes) -> dict[int, object]:
+        """Send one control command to every worker and return the answers by index."""
+        with self._lock:
+            workers = list(self._workers.items())
+        answers = {}
+        # A slow worker can take the whole socket timeout; the supervisor lock stays
+        # free meanwhile so crash detection keeps running.
+        for index, worker in workers:
+            request_id = str(next(self._requests)).encode()
+            deadline = monotonic() + self.control_timeout_seconds
+            with worker.lock:
+                try:
+                    worker.control.sendall(request_id + b" " + command + b"\n")
+                    answers[index] = self.reply(worker, request_id, deadline)
+                except (OSError, ValueError):
+                    continue
+        return answers
+
+    @staticmethod
+    def reply(worker: WorkerProcess, request_id: bytes, deadline: float) -> object:
+        """Read the worker's answer to `request_id`, skipping answers to earlier requests."""
+        while True:
+            line, newline, _rest = worker.pending.partition(b"\n")
+            if newline:
+                del worker.pending[: len(line) + 1]
+                answer_id, _, payload = bytes(line).partition(b" ")
+                if answer_id == request_id:
+                    return json.loads(payload)
+                continue
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutError("worker control reply timed out")
+            worker.control.settimeout(remaining)
+            chunk = worker.control.recv(65536)
+            if not chunk:
+                raise ConnectionError("worker closed its control channel")
+            worker.pending.extend(chunk)
+
+    def collect(self) -> bytes:
+        merged = MetricsRegistry(LATENCY_BUCKETS)
+        for snapshot in self.ask(b"metrics").values():
+            merged.merge(snapshot)
+            merged.inc("banklab_web_workers", ())
+        merged.inc("banklab_web_worker_restarts_total", (), self.restarts)
+        return merged.render_prometheus()
+
+    def upstream(self) -> dict:
+        return {"workers": {str(index): stats for index, stats in self.ask(b"upstream").items()}}
+
+    def backoff(self, index: int, lived: float) -> float:
+        """Return how long to wait before restarting a worker that ran for `lived` seconds."""
+        failures = 1 if lived >= self.max_backoff_seconds else self._failures.get(index, 0) + 1
+        self._failures[index] = failures
+        return min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (failures - 1))
+
+    def reap(self) -> None:
+        """Retire workers that exited and start any whose backoff has run out."""
+        now = monotonic()
+        with self._lock:
+            for index, worker in list(self._workers.items()):
+                if worker.process.poll() is None:
+                    continue
+                del self._workers[index]
+                delay = self.backoff(index, now - worker.started)
+                self._restart_at[index] = now + delay
+                log_event(
+                    "worker-exited",
+                    index=index,
+                    pid=worker.process.pid,
+                    code=worker.process.returncode,
+                    restart_in=delay,
+                )
+                with worker.lock:
+                    worker.control.close()
+            for index, restart_at in list(self._restart_at.items()):
+                if restart_at <= now:
+                    del self._restart_at[index]
+                    self.restarts += 1
+                    self.spawn(index)
+
+    def run(self) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_args: self.stopping.set())
+        with self._lock:
+            for index in range(self.count):
+                self.spawn(index)
+        metrics = serve_admin(METRICS_PORT, self.collect, self.upstream)
+
+        while not self.stopping.wait(0.1):
+            self.reap()
+
+        metrics.shutdown()
+        self.drain()
+        ACCESS_LOG.close()
+
+    def drain(self) -> None:
+        with self._lock:
+            processes = [worker.process for worker in self._workers.values()]
+        for process in processes:
+            process.terminate()
+        deadline = monotonic() + self.drain_seconds
+        for process in processes:
+            try:
+                process.wait(max(0, deadline - monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def log_event(event: str, **fields: object) -> None:
+    print(json.dumps({"event": event, **fields}, separators=(",", ":")), flush=True)
+
+
 if __name__ == "__main__":
-    print(f"banklab customer web listening on {APP_PORT}", flush=True)
-    ThreadingHTTPServer(("0.0.0.0", APP_PORT), Handler).serve_forever()
+    control_fd = os.environ.get("APP_CONTROL_FD")
+    if control_fd is not None:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        serve(reuse_port=True, control_fd=int(control_fd))
+    elif APP_WORKERS > 1:
+        print(f"banklab customer web supervising {APP_WORKERS} workers on {APP_PORT}", flush=True)
+        Supervisor(APP_WORKERS, DRAIN_SECONDS).run()
+    else:
+        print(f"banklab customer web listening on {APP_PORT} ({APP_ENGINE})", flush=True)
+        serve()
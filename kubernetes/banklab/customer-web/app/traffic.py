@@ -3,20 +3,67 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
 import hmac
 import http.client
+import itertools
 import json
+import math
 import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
 import time
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from itertools import cycle
+from pathlib import Path
+from typing import NamedTuple
 from uuid import uuid4
 
 PROXY = os.environ.get(
     "KONG_PROXY_HOST", "banklab-kong-gateway-proxy.platform-kong.svc.cluster.local"
 )
+PROXY_PORT = int(os.environ.get("KONG_PROXY_PORT", "80"))
+REUSE_CONNECTIONS = os.environ.get("TRAFFIC_REUSE_CONNECTIONS", "true").lower() != "false"
 INTERVAL = float(os.environ.get("TRAFFIC_INTERVAL_SECONDS", "0.25"))
+MODE = os.environ.get("TRAFFIC_MODE", "closed")
+RATE = float(os.environ.get("TRAFFIC_RATE", "4"))
+ARRIVALS = os.environ.get("TRAFFIC_ARRIVALS", "poisson")
+STAGES = os.environ.get("TRAFFIC_STAGES", "")
+MAX_OUTSTANDING = int(os.environ.get("TRAFFIC_MAX_OUTSTANDING", "64"))
+SENDER = os.environ.get("TRAFFIC_SENDER", "threads")
+REQUEST_LOG = os.environ.get("TRAFFIC_REQUEST_LOG", "true").lower() != "false"
+SUMMARY_SECONDS = float(os.environ.get("TRAFFIC_SUMMARY_SECONDS", "60"))
+SCENARIOS_FILE = os.environ.get("TRAFFIC_SCENARIOS_FILE", "")
+SEED = os.environ.get("TRAFFIC_SEED", "")
+SECRETS_DIR = os.environ.get("TRAFFIC_SECRETS_DIR", "")
+SECRETS_CHECK_SECONDS = float(os.environ.get("TRAFFIC_SECRETS_CHECK_SECONDS", "10"))
+JWT_LIFETIME_SECONDS = 300
+JWT_REFRESH_SECONDS = float(os.environ.get("TRAFFIC_JWT_REFRESH_SECONDS", "30"))
+WORKERS = int(os.environ.get("TRAFFIC_WORKERS", "1"))
+DRAIN_SECONDS = float(os.environ.get("TRAFFIC_DRAIN_SECONDS", "10"))
+RECORD_FILE = os.environ.get("TRAFFIC_RECORD_FILE", "")
+REPLAY_FILE = os.environ.get("TRAFFIC_REPLAY_FILE", "")
+REPLAY_SPEED = float(os.environ.get("TRAFFIC_REPLAY_SPEED", "1"))
+REPLAY_TIMING = os.environ.get("TRAFFIC_REPLAY_TIMING", "original")
+METRICS_PORT = int(os.environ.get("TRAFFIC_METRICS_PORT", "0"))
+MISMATCH_WINDOW_SECONDS = int(os.environ.get("TRAFFIC_MISMATCH_WINDOW_SECONDS", "60"))
+PACING_HEADROOM = float(os.environ.get("TRAFFIC_PACING_HEADROOM", "0.9"))
+PROBE_SECONDS = float(os.environ.get("TRAFFIC_PROBE_SECONDS", "20"))
+PROBE_OVERLOAD = float(os.environ.get("TRAFFIC_PROBE_OVERLOAD", "2"))
+SECRET_HEADERS = {"apikey", "authorization"}
+# Replays mint a fresh request ID, so the original is not worth keeping either.
+UNRECORDED_HEADERS = {*SECRET_HEADERS, "x-request-id"}
+STOP = threading.Event()
 PROFILES = (
     ("mobile-banking", "accounts", "/accounts/v1/health", "ACCOUNTS_API_KEY"),
     ("payments-processor", "payments", "/payments/v1/health", "PAYMENTS_API_KEY"),
@@ -26,21 +73,100 @@ PROFILES = (
 )
 
 
+def b64url(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+JWT_HEADER = b64url(b'{"alg":"HS256","typ":"JWT"}')
+
+
+class Credentials:
+    """API keys and partner JWT material, preferring mounted secret files.
+
+    Files in `directory` are named after the environment variables they replace.
+    Their stat signature is checked at most every `check_seconds` and the files are
+    re-read when it changes, so rotated Secrets apply without a restart. A signed
+    JWT is reused until `refresh_seconds` before it expires.
+    """
+
+    def __init__(self, directory: str, check_seconds: float, refresh_seconds: float) -> None:
+        self.directory = Path(directory) if directory else None
+        self.check_seconds = check_seconds
+        self.refresh_seconds = refresh_seconds
+        self.minted = self.reused = self.reloads = 0
+        self._lock = threading.Lock()
+        self._values: dict[str, str] = {}
+        self._signature: tuple | None = None
+        self._checked = -math.inf
+        self._token: tuple[str, int] | None = None
+
+    def _reload(self) -> None:
+        now = time.monotonic()
+        if self.directory is None or now - self._checked < self.check_seconds:
+            return
+        self._checked = now
+        # Kubernetes swaps the ..data symlink on update; the visible names follow it.
+        files = sorted(
+            path
+            for path in self.directory.iterdir()
+            if not path.name.startswith(".") and path.is_file()
+        )
+        signature = tuple(
+            (path.name, stat.st_mtime_ns, stat.st_ino, stat.st_size)
+            for path, stat in ((path, path.stat()) for path in files)
+        )
+        if signature == self._signature:
+            return
+        self._values = {path.name: path.read_text().strip() for path in files}
+        if self._signature is not None:
+            self.reloads += 1
+        self._signature = signature
+        self._token = None
+
+    def get(self, name: str) -> str:
+        with self._lock:
+            self._reload()
+            value = self._values.get(name)
+        return os.environ[name] if value is None else value
+
+    def jwt_token(self) -> str:
+        now = int(time.time())
+        with self._lock:
+            self._reload()
+            if self._token is not None and now < self._token[1] - self.refresh_seconds:
+                self.reused += 1
+                return self._token[0]
+        expires = now + JWT_LIFETIME_SECONDS
+        payload = b64url(
+            json.dumps({"iss": self.get("JWT_KEY"), "exp": expires}, separators=(",", ":")).encode()
+        )
+        message = f"{JWT_HEADER}.{payload}"
+        signature = hmac.new(self.get("JWT_SECRET").encode(), message.encode(), hashlib.sha256)
+        token = f"{message}.{b64url(signature.digest())}"
+        with self._lock:
+            self._token = (token, expires)
+            self.minted += 1
+        return token
+
+    def counters(self) -> dict:
+        with self._lock:
+            return {"jwt_minted": self.minted, "jwt_reused": self.reused, "reloads": self.reloads}
+
+
+CREDENTIALS = Credentials(SECRETS_DIR, SECRETS_CHECK_SECONDS, JWT_REFRESH_SECONDS)
+
+
 def jwt_token() -> str:
-    def encode(value: bytes) -> str:
-        return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+    return CREDENTIALS.jwt_token()
 
-    header = encode(b'{"alg":"HS256","typ":"JWT"}')
-    payload = encode(
-        json.dumps(
-            {"iss": os.environ["JWT_KEY"], "exp": int(time.time()) + 300}, separators=(",", ":")
-        ).encode()
-    )
-    message = f"{header}.{payload}"
-    signature = encode(
-        hmac.new(os.environ["JWT_SECRET"].encode(), message.encode(), hashlib.sha256).digest()
-    )
-    return f"{message}.{signature}"
+
+def with_credential(headers: dict, credential: str | None) -> dict:
+    """Add the apikey named by `credential`, or a partner JWT for `jwt`."""
+    if credential == "jwt":
+        headers["Authorization"] = f"Bearer {jwt_token()}"
+    elif credential:
+        headers["apikey"] = CREDENTIALS.get(credential)
+    return headers
 
 
 def event(counter: int, profile: tuple[str, str, str, str]) -> dict:
@@ -50,13 +176,15 @@ def event(counter: int, profile: tuple[str, str, str, str]) -> dict:
         "Host": host,
         "User-Agent": f"banklab-{client}",
         "X-Request-ID": f"traffic-{uuid4()}",
-        "apikey": os.environ[key_name],
+        "apikey": CREDENTIALS.get(key_name),
     }
     expected = 200
     scenario = "steady"
+    credential = key_name
 
     if counter % 41 == 0:
         headers.pop("apikey")
+        credential = None
         expected = 401
         scenario = "missing-credential"
     elif counter % 67 == 0:
@@ -73,10 +201,12 @@ def event(counter: int, profile: tuple[str, str, str, str]) -> dict:
             "Authorization": f"Bearer {jwt_token()}",
         }
         client, api = "fintech-partner", "open-banking"
+        credential = "jwt"
         scenario = "partner"
     elif counter % 113 == 0:
         path = "/cards/v1/simulate-500"
-        headers["apikey"] = os.environ["CARDS_API_KEY"]
+        credential = "CARDS_API_KEY"
+        headers["apikey"] = CREDENTIALS.get(credential)
         client, api = "internet-banking", "cards"
         expected = 500
         scenario = "planned-backend-error"
@@ -88,25 +218,575 @@ def event(counter: int, profile: tuple[str, str, str, str]) -> dict:
         "headers": headers,
         "expected": expected,
         "scenario": scenario,
+        "credential": credential,
     }
 
 
-def send(item: dict) -> None:
-    started = time.monotonic()
-    status = 0
-    connection = http.client.HTTPConnection(PROXY, 80, timeout=5)
-    try:
-        connection.request("GET", item["path"], headers=item["headers"])
-        response = connection.getresponse()
-        status = response.status
-        response.read()
-    except OSError as exc:
-        error = str(exc)
-    else:
-        error = None
-    finally:
-        connection.close()
+class AliasTable:
+    """Weighted choice in O(1) per draw using Vose's alias method."""
+
+    def __init__(self, weights: dict[str, float]) -> None:
+        self.names = [name for name, weight in weights.items() if weight > 0]
+        if not self.names:
+            raise ValueError("at least one scenario needs a positive weight")
+        total = sum(weights[name] for name in self.names)
+        size = len(self.names)
+        self.probability = [weights[name] * size / total for name in self.names]
+        self.alias = list(range(size))
+        small = [index for index, value in enumerate(self.probability) if value < 1]
+        large = [index for index, value in enumerate(self.probability) if value >= 1]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.alias[low] = high
+            self.probability[high] += self.probability[low] - 1
+            (small if self.probability[high] < 1 else large).append(high)
+        for index in small + large:
+            self.probability[index] = 1.0
+
+    def sample(self, rng: random.Random) -> str:
+        index = rng.randrange(len(self.names))
+        if rng.random() < self.probability[index]:
+            return self.names[index]
+        return self.names[self.alias[index]]
+
+
+SCENARIO_FIELDS = {"client", "api", "path", "host", "user_agent", "auth", "key", "expect"}
+
+
+class ScenarioEngine:
+    """Weighted scenarios from a JSON file, compiled once into alias tables.
+
+    The file has `scenarios` (name to request overrides), base `weights`, optional
+    `profiles` weight overrides keyed by client and optional `phases`, each with a
+    `requests` length and its own weight overrides. Phases repeat in order. Each
+    client draws from its own generator, derived from the seed, so a seed repeats
+    every profile's sequence however the profile threads interleave.
+    """
+
+    def __init__(self, config: dict, seed: int | None = None) -> None:
+        self.scenarios = config["scenarios"]
+        for name, spec in self.scenarios.items():
+            unknown = set(spec) - SCENARIO_FIELDS
+            if unknown:
+                raise ValueError(f"scenario {name} has unknown fields {sorted(unknown)}")
+            if spec.get("auth", "apikey") not in {"apikey", "jwt", "none"}:
+                raise ValueError(f"scenario {name} has unknown auth {spec['auth']}")
+        phases = config.get("phases") or [{"name": "default", "requests": 1}]
+        self.phase_names = [phase["name"] for phase in phases]
+        self.phase_ends = []
+        total = 0
+        for phase in phases:
+            total += int(phase["requests"])
+            self.phase_ends.append(total)
+        self.tables: dict[tuple[int, str], AliasTable] = {}
+        for index, phase in enumerate(phases):
+            for client, *_rest in PROFILES:
+                weights = {
+                    **config["weights"],
+                    **phase.get("weights", {}),
+                    **config.get("profiles", {}).get(client, {}),
+                }
+                missing = set(weights) - set(self.scenarios)
+                if missing:
+                    raise ValueError(f"weights name unknown scenarios {sorted(missing)}")
+                self.tables[index, client] = AliasTable(weights)
+        seed = config.get("seed") if seed is None else seed
+        self.rngs = {
+            client: random.Random(None if seed is None else f"{seed}:{client}")
+            for client, *_rest in PROFILES
+        }
+
+    @classmethod
+    def load(cls, path: str, seed: int | None = None) -> ScenarioEngine:
+        with open(path, encoding="utf-8") as handle:
+            return cls(json.load(handle), seed)
+
+    def event(self, counter: int, profile: tuple[str, str, str, str]) -> dict:
+        phase = bisect_right(self.phase_ends, (counter - 1) % self.phase_ends[-1])
+        name = self.tables[phase, profile[0]].sample(self.rngs[profile[0]])
+        return self.build(name, profile)
+
+    def build(self, name: str, profile: tuple[str, str, str, str]) -> dict:
+        spec = self.scenarios[name]
+        client = spec.get("client", profile[0])
+        headers = {
+            "Host": spec.get("host", "api.internal.banklab.test"),
+            "User-Agent": spec.get("user_agent", f"banklab-{client}"),
+            "X-Request-ID": f"traffic-{uuid4()}",
+        }
+        auth = spec.get("auth", "apikey")
+        credential = {"apikey": spec.get("key", profile[3]), "jwt": "jwt"}.get(auth)
+        return {
+            "client": client,
+            "api": spec.get("api", profile[1]),
+            "path": spec.get("path", profile[2]),
+            "headers": with_credential(headers, credential),
+            "expected": int(spec.get("expect", 200)),
+            "scenario": name,
+            "credential": credential,
+        }
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of microsecond latencies.
+
+    Values below 256us get their own bucket. Above that, each power of two is split
+    into 128 buckets, so a reported percentile is within 1% of the recorded value.
+    The bucket array is sized once from `highest_us`, and larger values are clamped.
+    """
+
+    sub_bucket_bits = 7
+
+    def __init__(self, highest_us: int = 60_000_000) -> None:
+        self.highest_us = highest_us
+        self.counts = [0] * (self.index(highest_us) + 1)
+        self.count = 0
+        self.max_us = 0
+
+    @classmethod
+    def index(cls, value: int) -> int:
+        half = 1 << cls.sub_bucket_bits
+        if value < 2 * half:
+            return value
+        shift = value.bit_length() - cls.sub_bucket_bits - 1
+        return 2 * half + (shift - 1) * half + (value >> shift) - half
+
+    @classmethod
+    def value_at(cls, index: int) -> int:
+        """Return the highest value that lands in bucket `index`."""
+        half = 1 << cls.sub_bucket_bits
+        if index < 2 * half:
+            return index
+        shift = (index - 2 * half) // half + 1
+        top = (index - 2 * half) % half + half
+        return ((top + 1) << shift) - 1
+
+    def record(self, value_us: int) -> None:
+        value_us = min(max(0, value_us), self.highest_us)
+        self.counts[self.index(value_us)] += 1
+        self.count += 1
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: LatencyHistogram) -> None:
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.max_us = max(self.max_us, other.max_us)
+
+    def sparse(self) -> dict:
+        """Return a JSON-friendly copy that only lists non-empty buckets."""
+        buckets = [[index, count] for index, count in enumerate(self.counts) if count]
+        return {"count": self.count, "max_us": self.max_us, "buckets": buckets}
+
+    @classmethod
+    def from_sparse(cls, data: dict) -> LatencyHistogram:
+        histogram = cls()
+        for index, count in data["buckets"]:
+            histogram.counts[index] += count
+        histogram.count = data["count"]
+        histogram.max_us = data["max_us"]
+        return histogram
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.value_at(index), self.max_us)
+        return self.max_us
+
+
+def corrected_samples(value: float, interval: float | None) -> list[float]:
+    """Return `value` plus the latencies of the sends a wait that long held back.
+
+    This is HdrHistogram's expected-interval correction. A closed loop that waited
+    `value` for one answer skipped a send every `interval` meanwhile, and each of
+    those would have waited `interval` less.
+    """
+    samples = [value]
+    if interval:
+        missing = value - interval
+        while missing >= interval:
+            samples.append(missing)
+            missing -= interval
+    return samples
+
+
+class TrafficStats:
+    """Per client, API and scenario histograms, printed and reset once per interval.
+
+    Each series keeps two histograms. `latency` runs from when the request actually
+    started. `corrected` runs from when the schedule meant to send it, so requests
+    held back behind a stall carry the wait that coordinated omission would hide.
+    Closed-loop requests instead pass their `interval`, and the sends a slow answer
+    skipped are back-filled into `corrected`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: dict[tuple[str, str, str], list] = {}
+        self._since = time.monotonic()
+
+    def _get(self, key: tuple[str, str, str]) -> list:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [LatencyHistogram(), LatencyHistogram(), 0]
+        return series
+
+    def record(
+        self,
+        item: dict,
+        latency_us: int,
+        corrected_us: int,
+        ok: bool,
+        interval_us: int | None = None,
+    ) -> None:
+        key = (item["client"], item["api"], item["scenario"])
+        with self._lock:
+            series = self._get(key)
+            series[0].record(latency_us)
+            for value_us in corrected_samples(corrected_us, interval_us):
+                series[1].record(value_us)
+            series[2] += ok
+
+    def take(self) -> list:
+        """Hand over and reset the current series for another process to merge."""
+        with self._lock:
+            series, self._series = self._series, {}
+        return [
+            [*key, ok, latency.sparse(), corrected.sparse()]
+            for key, (latency, corrected, ok) in series.items()
+        ]
+
+    def merge(self, taken: list) -> None:
+        with self._lock:
+            for client, api, scenario, ok, latency, corrected in taken:
+                series = self._get((client, api, scenario))
+                series[0].merge(LatencyHistogram.from_sparse(latency))
+                series[1].merge(LatencyHistogram.from_sparse(corrected))
+                series[2] += ok
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            series, self._series = self._series, {}
+            interval, self._since = now - self._since, now
+        for (client, api, scenario), (latency, corrected, ok) in sorted(series.items()):
+            print(
+                json.dumps(
+                    {
+                        "event": "banklab-traffic-summary",
+                        "client": client,
+                        "api": api,
+                        "scenario": scenario,
+                        "interval_s": round(interval, 3),
+                        "count": latency.count,
+                        "ok_ratio": round(ok / latency.count, 4),
+                        "p50_ms": latency.percentile(50) / 1000,
+                        "p90_ms": latency.percentile(90) / 1000,
+                        "p99_ms": latency.percentile(99) / 1000,
+                        "max_ms": latency.max_us / 1000,
+                        "corrected_count": corrected.count,
+                        "corrected_p50_ms": corrected.percentile(50) / 1000,
+                        "corrected_p90_ms": corrected.percentile(90) / 1000,
+                        "corrected_p99_ms": corrected.percentile(99) / 1000,
+                        "corrected_max_ms": corrected.max_us / 1000,
+                    },
+                    separators=(",", ":"),
+                ),
+                flush=True,
+            )
+
+
+STATS = TrafficStats()
+
+
+METRIC_HELP = {
+    "banklab_traffic_requests_total": "Synthetic requests by expected and actual status.",
+    "banklab_traffic_request_duration_seconds": "Time from sending a request to its response.",
+    "banklab_traffic_corrected_duration_seconds": (
+        "Time from a request's scheduled send time to its response."
+    ),
+    "banklab_traffic_mismatch_ratio": (
+        "Share of requests in the recent window whose status differed from the expected one."
+    ),
+}
+
+
+class TrafficMetrics:
+    """Cumulative Prometheus series for /metrics that worker processes can merge.
+
+    The mismatch ratio is kept per second for the last `window_seconds`, so the
+    gauge follows recent behaviour while memory stays bounded.
+    """
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, window_seconds: int) -> None:
+        self.window_seconds = max(1, window_seconds)
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, int] = {}
+        self._histograms: dict[tuple, list] = {}
+        self._window: dict[tuple, dict[int, list[int]]] = {}
+
+    def record(
+        self,
+        item: dict,
+        status: int,
+        latency: float,
+        corrected: float,
+        interval: float | None = None,
+    ) -> None:
+        series = (item["client"], item["api"], item["scenario"])
+        counter = (*series, str(item["expected"]), str(status))
+        second = int(time.time())
+        samples = (("request", [latency]), ("corrected", corrected_samples(corrected, interval)))
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + 1
+            for name, values in samples:
+                histogram = self._histograms.get((name, *series))
+                if histogram is None:
+                    histogram = self._histograms[name, *series] = [0] * (len(self.buckets) + 2)
+                for value in values:
+                    histogram[bisect_left(self.buckets, value)] += 1
+                    histogram[-1] += value
+            slots = self._window.setdefault(series, {})
+            slot = slots.setdefault(second, [0, 0])
+            slot[0] += 1
+            slot[1] += status != item["expected"]
+            for old in [old for old in slots if old <= second - self.window_seconds]:
+                del slots[old]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[*key, value] for key, value in self._counters.items()],
+                "histograms": [[*key, list(value)] for key, value in self._histograms.items()],
+                "window": [
+                    [*key, [[second, *slot] for second, slot in slots.items()]]
+                    for key, slots in self._window.items()
+                ],
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        with self._lock:
+            for *key, value in snapshot["counters"]:
+                self._counters[tuple(key)] = self._counters.get(tuple(key), 0) + value
+            for *key, values in snapshot["histograms"]:
+                current = self._histograms.setdefault(tuple(key), [0] * len(values))
+                self._histograms[tuple(key)] = [a + b for a, b in zip(current, values, strict=True)]
+            for *key, slots in snapshot["window"]:
+                window = self._window.setdefault(tuple(key), {})
+                for second, total, mismatched in slots:
+                    slot = window.setdefault(second, [0, 0])
+                    slot[0] += total
+                    slot[1] += mismatched
+
+    def render_prometheus(self) -> bytes:
+        cutoff = int(time.time()) - self.window_seconds
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP banklab_traffic_requests_total "
+                + METRIC_HELP["banklab_traffic_requests_total"],
+                "# TYPE banklab_traffic_requests_total counter",
+            ]
+            for (client, api, scenario, expected, status), value in sorted(self._counters.items()):
+                labels = metric_labels(client, api, scenario, expected=expected, status=status)
+                lines.append(f"banklab_traffic_requests_total{{{labels}}} {value}")
+            for name in ("request", "corrected"):
+                metric = f"banklab_traffic_{name}_duration_seconds"
+                lines += [f"# HELP {metric} {METRIC_HELP[metric]}", f"# TYPE {metric} histogram"]
+                for (kind, *series), values in sorted(self._histograms.items()):
+                    if kind != name:
+                        continue
+                    labels = metric_labels(*series)
+                    seen = 0
+                    for bound, count in zip((*self.buckets, "+Inf"), values[:-1], strict=True):
+                        seen += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {seen}')
+                    lines.append(f"{metric}_sum{{{labels}}} {values[-1]:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {seen}")
+            lines += [
+                "# HELP banklab_traffic_mismatch_ratio "
+                + METRIC_HELP["banklab_traffic_mismatch_ratio"],
+                "# TYPE banklab_traffic_mismatch_ratio gauge",
+            ]
+            for series, slots in sorted(self._window.items()):
+                recent = [slot for second, slot in slots.items() if second > cutoff]
+                total = sum(slot[0] for slot in recent)
+                ratio = sum(slot[1] for slot in recent) / total if total else 0.0
+                lines.append(
+                    f"banklab_traffic_mismatch_ratio{{{metric_labels(*series)}}} {ratio:.6f}"
+                )
+        return ("\n".join(lines) + "\n").encode()
+
+
+def metric_labels(client: str, api: str, scenario: str, **extra: str) -> str:
+    pairs = {"client": client, "api": api, "scenario": scenario, **extra}
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs.items())
+
+
+def escape_label(value: object) -> str:
+    # Scenario names come from the editable scenarios file.
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = TrafficMetrics(MISMATCH_WINDOW_SECONDS)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve /metrics from `render`, which the coordinator points at merged numbers."""
+
+    render = staticmethod(METRICS.render_prometheus)
+
+    def log_message(self, fmt: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = self.render()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(port: int, render: Callable[[], bytes]) -> ThreadingHTTPServer:
+    MetricsHandler.render = staticmethod(render)
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def summarize(credentials: dict | None = None) -> None:
+    STATS.flush()
+    print(
+        json.dumps(
+            {"event": "banklab-traffic-credentials", **(credentials or CREDENTIALS.counters())},
+            separators=(",", ":"),
+        ),
+        flush=True,
+    )
+
+
+def summarize_every(seconds: float, stop: threading.Event) -> None:
+    while not stop.wait(seconds):
+        summarize()
+
+
+class EventRecorder:
+    """Append one compact JSON line per finished request, with secrets and IDs left out.
+
+    Each line is a single O_APPEND write, so worker processes can share a file.
+    `t` is the request start relative to when the recorder was created, and
+    `credential` names the key or `jwt` so a replay can sign the request again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.started = time.monotonic()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(
+        self,
+        item: dict,
+        status: int,
+        started: float,
+        latency: float,
+        corrected: float,
+        error: str | None,
+    ) -> None:
+        line = {
+            "t": round(started - self.started, 6),
+            "client": item["client"],
+            "api": item["api"],
+            "path": item["path"],
+            "scenario": item["scenario"],
+            "credential": item.get("credential"),
+            "headers": {
+                name: value
+                for name, value in item["headers"].items()
+                if name.lower() not in UNRECORDED_HEADERS
+            },
+            "expected": item["expected"],
+            "status": status,
+            "ok": status == item["expected"],
+            "latency_ms": round(latency * 1000, 3),
+            "corrected_latency_ms": round(corrected * 1000, 3),
+            "error": error,
+        }
+        os.write(self._fd, json.dumps(line, separators=(",", ":")).encode() + b"\n")
+
+
+RECORDER = EventRecorder(RECORD_FILE) if RECORD_FILE else None
+
+
+def load_recording(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as handle:
+        records = [json.loads(line) for line in handle if line.strip()]
+    # Concurrent requests finish out of order, so lines are sorted back by start.
+    return sorted(records, key=lambda record: record["t"])
+
+
+def replay_item(record: dict) -> dict:
+    headers = {**record["headers"], "X-Request-ID": f"traffic-{uuid4()}"}
+    return {
+        "client": record["client"],
+        "api": record["api"],
+        "path": record["path"],
+        "headers": with_credential(headers, record["credential"]),
+        "expected": record["expected"],
+        "scenario": record["scenario"],
+        "credential": record["credential"],
+    }
+
+
+def replay(records: list[dict], speed: float, timed: bool, origin: float | None = None) -> None:
+    """Send recorded requests again, on their original schedule or back to back.
+
+    Offsets count from `origin`, the first recorded start, so worker slices of one
+    recording keep their place on the shared timeline.
+    """
+    items = (replay_item(record) for record in records)
+    if not timed:
+        for item in items:
+            if STOP.is_set():
+                break
+            send(item)
+        return
+    if origin is None:
+        origin = records[0]["t"] if records else 0.0
+    schedule = (((record["t"] - origin) / speed, "replay") for record in records)
+    open_loop_threads(schedule, items, MAX_OUTSTANDING)
 
+
+def report(item: dict, status: int, started: float, error: str | None, reused: bool) -> None:
+    finished = time.monotonic()
+    latency = finished - started
+    # Loops that follow a schedule set `intended`; the closed loop sets
+    # `expected_interval` so the sends it skipped are back-filled instead.
+    corrected = finished - item.get("intended", started)
+    interval = item.get("expected_interval")
+    ok = status == item["expected"]
+    STATS.record(
+        item,
+        round(latency * 1_000_000),
+        round(corrected * 1_000_000),
+        ok,
+        round(interval * 1_000_000) if interval else None,
+    )
+    METRICS.record(item, status, latency, corrected, interval)
+    if RECORDER is not None:
+        RECORDER.write(item, status, started, latency, corrected, error)
+    if not REQUEST_LOG:
+        return
     print(
         json.dumps(
             {
@@ -117,9 +797,11 @@ def send(item: dict) -> None:
                 "scenario": item["scenario"],
                 "status": status,
                 "expected_status": item["expected"],
-                "ok": status == item["expected"],
-                "latency_ms": round((time.monotonic() - started) * 1000),
+                "ok": ok,
+                "latency_ms": round(latency * 1000),
+                "corrected_latency_ms": round(corrected * 1000),
                 "request_id": item["headers"]["X-Request-ID"],
+                "reused": reused,
                 "error": error,
             },
             separators=(",", ":"),
@@ -128,7 +810,686 @@ def send(item: dict) -> None:
     )
 
 
+class ConnectionCache:
+    """Idle keep-alive connections to Kong, kept separately for each client profile.
+
+    The closed loop ends up with one connection per profile; concurrent open-loop
+    senders grow a small set per profile instead of sharing a socket.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: dict[str, list[http.client.HTTPConnection]] = {}
+
+    def take(self, client: str) -> http.client.HTTPConnection | None:
+        with self._lock:
+            idle = self._idle.get(client)
+            return idle.pop() if idle else None
+
+    def give(self, client: str, connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.setdefault(client, []).append(connection)
+
+
+CONNECTIONS = ConnectionCache()
+
+
+def send(item: dict) -> http.client.HTTPResponse | None:
+    """Send one request and return its read response, or None when it failed."""
+    started = time.monotonic()
+    status = 0
+    error = None
+    response = None
+    connection = CONNECTIONS.take(item["client"]) if REUSE_CONNECTIONS else None
+    reused = connection is not None
+    while True:
+        if connection is None:
+            connection = http.client.HTTPConnection(PROXY, PROXY_PORT, timeout=5)
+        try:
+            connection.request("GET", item["path"], headers=item["headers"])
+            response = connection.getresponse()
+            status = response.status
+            response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            connection.close()
+            if reused and isinstance(exc, ConnectionError):
+                # Kong closed the idle socket first; a GET is safe to send again.
+                connection, reused = None, False
+                continue
+            error = str(exc)
+            response = None
+        else:
+            if REUSE_CONNECTIONS and not response.will_close:
+                CONNECTIONS.give(item["client"], connection)
+            else:
+                connection.close()
+        break
+    report(item, status, started, error, reused)
+    return response
+
+
+async def send_async(item: dict) -> None:
+    started = time.monotonic()
+    status = 0
+    error = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(PROXY, PROXY_PORT), 5)
+        try:
+            lines = [f"GET {item['path']} HTTP/1.1"]
+            lines += [f"{name}: {value}" for name, value in item["headers"].items()]
+            writer.write("\r\n".join([*lines, "Connection: close", "", ""]).encode("latin-1"))
+            status_line = await asyncio.wait_for(reader.readline(), 5)
+            status = int(status_line.split()[1])
+            await asyncio.wait_for(reader.read(), 5)
+        finally:
+            writer.close()
+    except (OSError, TimeoutError, IndexError, ValueError) as exc:
+        error = str(exc) or type(exc).__name__
+    report(item, status, started, error, reused=False)
+
+
+RATE_WINDOWS = {
+    "Second": 1,
+    "Minute": 60,
+    "Hour": 3600,
+    "Day": 86400,
+    "Month": 2592000,
+    "Year": 31536000,
+}
+
+
+class RateLimit(NamedTuple):
+    limit: int
+    remaining: int
+    reset: float
+    window: int
+
+
+def rate_limit(headers: http.client.HTTPMessage) -> RateLimit | None:
+    """Read Kong's RateLimit-* headers, or None when the route sent none.
+
+    RateLimit-Limit describes the window closest to running out; the matching
+    X-RateLimit-Limit-<unit> header says how long that window is.
+    """
+    try:
+        limit = int(headers["RateLimit-Limit"])
+        remaining = int(headers["RateLimit-Remaining"])
+        reset = float(headers["RateLimit-Reset"])
+    except (TypeError, ValueError):
+        return None
+    window = next(
+        (
+            seconds
+            for unit, seconds in RATE_WINDOWS.items()
+            if headers.get(f"X-RateLimit-Limit-{unit}") == str(limit)
+            and headers.get(f"X-RateLimit-Remaining-{unit}") == str(remaining)
+        ),
+        1,
+    )
+    return RateLimit(limit, remaining, reset, window)
+
+
+class RatePacer:
+    """Per-consumer send rates steered by the limiter's response headers.
+
+    A consumer starts at `start_rate` and moves to `headroom` times the limit its
+    responses advertise. An exhausted window holds it until the reset. A 429 halves
+    its rate and holds it for Retry-After; every later success wins a little back.
+    """
+
+    def __init__(self, headroom: float, start_rate: float = 1.0) -> None:
+        self.headroom = headroom
+        self.start_rate = start_rate
+        self._lock = threading.Lock()
+        self._consumers: dict[str | None, dict] = {}
+
+    def _get(self, consumer: str | None) -> dict:
+        return self._consumers.setdefault(
+            consumer, {"limit_rate": None, "scale": 1.0, "next": 0.0, "throttled": 0}
+        )
+
+    def rate(self, consumer: str | None) -> float:
+        state = self._get(consumer)
+        if state["limit_rate"] is None:
+            return self.start_rate * state["scale"]
+        return state["limit_rate"] * self.headroom * state["scale"]
+
+    def reserve(self, consumer: str | None, now: float) -> float:
+        """Claim the consumer's next send slot and return its monotonic time."""
+        with self._lock:
+            state = self._get(consumer)
+            slot = max(now, state["next"])
+            state["next"] = slot + 1 / self.rate(consumer)
+            return slot
+
+    def observe(
+        self, consumer: str | None, response: http.client.HTTPResponse | None, now: float
+    ) -> None:
+        if response is None:
+            return
+        limit = rate_limit(response.headers)
+        with self._lock:
+            state = self._get(consumer)
+            if limit is not None:
+                state["limit_rate"] = limit.limit / limit.window
+            if response.status == 429:
+                state["throttled"] += 1
+                state["scale"] = max(0.1, state["scale"] / 2)
+                try:
+                    hold = float(response.getheader("Retry-After", ""))
+                except ValueError:
+                    hold = limit.reset if limit is not None else 1.0
+                state["next"] = max(state["next"], now + hold)
+                return
+            state["scale"] = min(1.0, state["scale"] + 0.05)
+            if limit is not None and limit.remaining == 0:
+                state["next"] = max(state["next"], now + limit.reset)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                str(consumer): {
+                    "rate": round(self.rate(consumer), 3),
+                    "throttled": state["throttled"],
+                }
+                for consumer, state in self._consumers.items()
+            }
+
+
+def events(
+    make_event: Callable[[int, tuple], dict] = event, profiles: tuple = PROFILES
+) -> Iterator[dict]:
+    for count, profile in enumerate(cycle(profiles), start=1):
+        yield make_event(count, profile)
+
+
+class Stage(NamedTuple):
+    name: str
+    seconds: float
+    start_rate: float
+    end_rate: float
+
+    def rate(self, elapsed: float) -> float:
+        if not math.isfinite(self.seconds) or self.seconds <= 0:
+            return self.end_rate
+        return self.start_rate + (self.end_rate - self.start_rate) * elapsed / self.seconds
+
+
+def parse_stages(text: str, default_rate: float) -> list[Stage]:
+    """Parse `name:seconds:rate` or `name:seconds:from-to` stages separated by commas."""
+    if not text.strip():
+        return [Stage("steady", math.inf, default_rate, default_rate)]
+    stages = []
+    for spec in text.split(","):
+        name, seconds, rates = spec.strip().split(":")
+        start, _, end = rates.partition("-")
+        stages.append(Stage(name, float(seconds), float(start), float(end or start)))
+    return stages
+
+
+def arrivals(stages: list[Stage], poisson: bool, rng: random.Random) -> Iterator[tuple[float, str]]:
+    """Yield (offset from start, stage name) for each planned request."""
+    offset = 0.0
+    for stage in stages:
+        elapsed = 0.0
+        while elapsed < stage.seconds:
+            rate = stage.rate(elapsed)
+            if rate <= 0:
+                elapsed += 0.05
+                continue
+            gap = rng.expovariate(rate) if poisson else 1 / rate
+            elapsed += gap
+            if elapsed < stage.seconds:
+                yield offset + elapsed, stage.name
+        offset += stage.seconds
+
+
+class StageCounter:
+    """Count planned, sent and dropped arrivals and print one line per stage."""
+
+    def __init__(self) -> None:
+        self.stage: str | None = None
+        self.sent = 0
+        self.dropped = 0
+
+    def arrival(self, stage: str, admitted: bool) -> None:
+        if stage != self.stage:
+            self.flush()
+            self.stage, self.sent, self.dropped = stage, 0, 0
+        if admitted:
+            self.sent += 1
+        else:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        if self.stage is None:
+            return
+        print(
+            json.dumps(
+                {
+                    "event": "banklab-traffic-stage",
+                    "stage": self.stage,
+                    "sent": self.sent,
+                    "dropped": self.dropped,
+                },
+                separators=(",", ":"),
+            ),
+            flush=True,
+        )
+
+
+def open_loop_threads(
+    schedule: Iterator[tuple[float, str]],
+    items: Iterator[dict],
+    max_outstanding: int,
+    sender: Callable[[dict], None] = send,
+) -> None:
+    """Send on schedule from a thread pool, dropping arrivals once the pool is full.
+
+    Waiting for a free slot would let a slow gateway push the schedule back, which is
+    the closed-loop behaviour this mode exists to avoid.
+    """
+    counter = StageCounter()
+    slots = threading.BoundedSemaphore(max_outstanding)
+    started = time.monotonic()
+
+    def run(item: dict) -> None:
+        try:
+            sender(item)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_outstanding) as pool:
+        for offset, stage in schedule:
+            if STOP.wait(max(0.0, started + offset - time.monotonic())):
+                break
+            item = next(items)
+            item["intended"] = started + offset
+            admitted = slots.acquire(blocking=False)
+            counter.arrival(stage, admitted)
+            if admitted:
+                pool.submit(run, item)
+    counter.flush()
+
+
+async def open_loop_async(
+    schedule: Iterator[tuple[float, str]],
+    items: Iterator[dict],
+    max_outstanding: int,
+    sender: Callable[[dict], object] = send_async,
+) -> None:
+    """Event-loop version of open_loop_threads with the same dropping rule."""
+    counter = StageCounter()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending: set[asyncio.Task] = set()
+    for offset, stage in schedule:
+        delay = started + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if STOP.is_set():
+            break
+        item = next(items)
+        item["intended"] = started + offset
+        admitted = len(pending) < max_outstanding
+        counter.arrival(stage, admitted)
+        if admitted:
+            task = asyncio.create_task(sender(item))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+    counter.flush()
+
+
+def paced(
+    profiles: tuple,
+    make_event: Callable[[int, tuple], dict],
+    pacer: RatePacer,
+    clock: Callable[[], float] = time.monotonic,
+    wait: Callable[[float], bool] = STOP.wait,
+) -> None:
+    """Run a closed loop per profile, each send waiting for its consumer's next slot.
+
+    `wait` sleeps and reports whether to stop; with `clock` it lets a test run the
+    loop on simulated time.
+    """
+
+    def run(profile: tuple) -> None:
+        for item in events(make_event, (profile,)):
+            slot = pacer.reserve(item["credential"], clock())
+            if wait(max(0.0, slot - clock())):
+                return
+            item["intended"] = slot
+            pacer.observe(item["credential"], send(item), clock())
+
+    threads = [threading.Thread(target=run, args=(profile,)) for profile in profiles]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(
+        json.dumps(
+            {"event": "banklab-traffic-pacing", "consumers": pacer.snapshot()},
+            separators=(",", ":"),
+        ),
+        flush=True,
+    )
+
+
+def percentile_ms(latencies: list[float], percent: float) -> float | None:
+    if not latencies:
+        return None
+    histogram = LatencyHistogram()
+    for latency in latencies:
+        histogram.record(round(latency * 1_000_000))
+    return round(histogram.percentile(percent) / 1000, 2)
+
+
+def probe(profile: tuple, seconds: float, overload: float) -> dict:
+    """Measure how exactly the limiter enforces its limit and what its answers cost.
+
+    One request reads the advertised limit. The consumer is then driven for `seconds`
+    at half the limit and again at `overload` times it. Overload responses are grouped
+    into the limiter's windows by their Date header, and only windows that rejected
+    something, away from the phase edges, count towards precision.
+    """
+
+    def request(scenario: str) -> tuple[int, float, float | None, RateLimit | None]:
+        # Counter 1 is the steady scenario for every profile.
+        item = {**event(1, profile), "scenario": scenario}
+        started = time.monotonic()
+        response = send(item)
+        latency = time.monotonic() - started
+        if response is None:
+            return 0, latency, None, None
+        date = response.getheader("Date")
+        stamp = parsedate_to_datetime(date).timestamp() if date else None
+        return response.status, latency, stamp, rate_limit(response.headers)
+
+    result = {"event": "banklab-traffic-probe", "client": profile[0], "api": profile[1]}
+    limit = request("probe-limit")[3]
+    if limit is None:
+        return {**result, "error": "no rate-limit headers on the first response"}
+    result.update(limit=limit.limit, window_seconds=limit.window)
+    phases = {}
+    for name, factor in (("under", 0.5), ("over", overload)):
+        rate = limit.limit / limit.window * factor
+        samples = []
+        started = time.monotonic()
+        for number in range(max(1, round(seconds * rate))):
+            if STOP.wait(max(0.0, started + number / rate - time.monotonic())):
+                break
+            samples.append(request(f"probe-{name}"))
+        phases[name] = samples
+
+    windows: dict[int, list[int]] = {}
+    for status, _latency, stamp, _limit in phases["over"]:
+        if stamp is not None and status in {200, 429}:
+            counts = windows.setdefault(int(stamp // limit.window), [0, 0])
+            counts[status == 429] += 1
+    saturated = [admitted for admitted, rejected in list(windows.values())[1:-1] if rejected]
+    result.update(
+        windows=len(saturated),
+        admitted_mean=round(sum(saturated) / len(saturated), 2) if saturated else None,
+        admitted_min=min(saturated, default=None),
+        admitted_max=max(saturated, default=None),
+        overshoot_windows=sum(admitted > limit.limit for admitted in saturated),
+        early_reject_windows=sum(admitted < limit.limit for admitted in saturated),
+    )
+    for name, status in (("under_admitted", 200), ("over_admitted", 200), ("rejected", 429)):
+        phase = phases["under" if name.startswith("under") else "over"]
+        latencies = [latency for got, latency, *_rest in phase if got == status]
+        result[f"{name}_p50_ms"] = percentile_ms(latencies, 50)
+        result[f"{name}_p99_ms"] = percentile_ms(latencies, 99)
+    return result
+
+
+def worker_share(index: int, count: int) -> tuple[tuple, float]:
+    """Split the profiles between `count` workers and return this worker's rate share.
+
+    With more workers than profiles, the workers that share a profile split its
+    share between them, so every profile keeps the rate it has in one process.
+    """
+    if count > len(PROFILES):
+        profile = index % len(PROFILES)
+        sharing = len(range(profile, count, len(PROFILES)))
+        return (PROFILES[profile],), 1 / (len(PROFILES) * sharing)
+    profiles = PROFILES[index::count]
+    return profiles, len(profiles) / len(PROFILES)
+
+
+def generate(index: int, count: int, seed: int | None) -> None:
+    if MODE == "replay":
+        records = load_recording(REPLAY_FILE)
+        origin = records[0]["t"] if records else 0.0
+        replay(records[index::count], REPLAY_SPEED, REPLAY_TIMING != "none", origin)
+        return
+    profiles, share = worker_share(index, count)
+    if MODE == "probe":
+        result = probe(profiles[0], PROBE_SECONDS, PROBE_OVERLOAD)
+        print(json.dumps(result, separators=(",", ":")), flush=True)
+        return
+    make_event = ScenarioEngine.load(SCENARIOS_FILE, seed).event if SCENARIOS_FILE else event
+    if MODE == "paced":
+        # Workers that share a profile also share its consumer's rate limit.
+        profile_share = share * len(PROFILES) / len(profiles)
+        paced(profiles, make_event, RatePacer(PACING_HEADROOM * profile_share, profile_share))
+        return
+    items = events(make_event, profiles)
+    if MODE != "open":
+        # Each worker stretches the interval by its share so all of them together still
+        # send one request per TRAFFIC_INTERVAL_SECONDS.
+        interval = INTERVAL / share
+        next_send = time.monotonic()
+        for item in items:
+            if STOP.wait(max(0.0, next_send - time.monotonic())):
+                break
+            item["expected_interval"] = interval
+            send(item)
+            # After a stall the schedule restarts from now: the slots it missed are
+            # back-filled into the corrected histogram, not fired at Kong in a burst.
+            next_send = max(next_send + interval, time.monotonic())
+        return
+    stages = [
+        stage._replace(start_rate=stage.start_rate * share, end_rate=stage.end_rate * share)
+        for stage in parse_stages(STAGES, RATE)
+    ]
+    schedule = arrivals(stages, ARRIVALS == "poisson", random.Random(seed))
+    if SENDER == "asyncio":
+        asyncio.run(open_loop_async(schedule, items, MAX_OUTSTANDING))
+    else:
+        open_loop_threads(schedule, items, MAX_OUTSTANDING)
+
+
+class WorkerControl:
+    """Answer coordinator `stats` requests over the inherited control socket."""
+
+    def __init__(self, fd: int) -> None:
+        self._socket = socket.socket(fileno=fd)
+        self._stream = self._socket.makefile("rwb")
+        self._lock = threading.Lock()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        try:
+            for line in self._stream:
+                request_id, _, command = line.strip().partition(b" ")
+                if command == b"stats":
+                    self.send(request_id)
+        except OSError:
+            pass
+        # The coordinator went away, so nothing will read our numbers.
+        STOP.set()
+
+    def send(self, request_id: bytes = b"final") -> None:
+        message = {
+            "stats": STATS.take(),
+            "credentials": CREDENTIALS.counters(),
+            "metrics": METRICS.snapshot(),
+        }
+        with self._lock:
+            payload = json.dumps(message, separators=(",", ":")).encode()
+            self._stream.write(request_id + b" " + payload + b"\n")
+            self._stream.flush()
+
+    def close(self) -> None:
+        try:
+            self.send()
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class Coordinator:
+    """Run generator workers that split the rate and profiles, and merge their stats.
+
+    Every message a worker sends is absorbed, even one that answers a request that
+    already timed out, since `stats` hands over histograms the worker no longer has.
+    A worker that misses a round drops out of the exported metrics until it answers.
+    """
+
+    def __init__(
+        self, workers: int, drain_seconds: float, control_timeout_seconds: float = 5.0
+    ) -> None:
+        self.count = workers
+        self.drain_seconds = drain_seconds
+        self.control_timeout_seconds = control_timeout_seconds
+        self.credentials: dict[int, dict] = {}
+        self.metrics: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._requests = itertools.count(1)
+        # Each worker's process, control socket and bytes read past its last message.
+        self._workers: list[tuple[subprocess.Popen, socket.socket, bytearray]] = []
+
+    def spawn(self, index: int) -> None:
+        parent, child = socket.socketpair()
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve())],
+            env={
+                **os.environ,
+                "TRAFFIC_WORKER_INDEX": str(index),
+                "TRAFFIC_WORKER_COUNT": str(self.count),
+                "TRAFFIC_CONTROL_FD": str(child.fileno()),
+            },
+            pass_fds=(child.fileno(),),
+        )
+        child.close()
+        self._workers.append((process, parent, bytearray()))
+
+    def absorb(self, index: int, line: bytes) -> None:
+        message = json.loads(line)
+        STATS.merge(message["stats"])
+        self.credentials[index] = message["credentials"]
+        self.metrics[index] = message["metrics"]
+
+    def receive(
+        self, index: int, control: socket.socket, pending: bytearray, request_id: bytes
+    ) -> None:
+        """Absorb worker `index`'s messages until the one answering `request_id`."""
+        deadline = time.monotonic() + self.control_timeout_seconds
+        while True:
+            line, newline, _rest = pending.partition(b"\n")
+            if newline:
+                del pending[: len(line) + 1]
+                answer_id, _, message = bytes(line).partition(b" ")
+                self.absorb(index, message)
+                if answer_id == request_id:
+                    return
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("traffic worker did not answer in time")
+            control.settimeout(remaining)
+            chunk = control.recv(65536)
+            if not chunk:
+                raise ConnectionError("traffic worker closed its control socket")
+            pending.extend(chunk)
+
+    def collect(self) -> None:
+        with self._lock:
+            for index, (_process, control, pending) in enumerate(self._workers):
+                request_id = str(next(self._requests)).encode()
+                try:
+                    control.sendall(request_id + b" stats\n")
+                    self.receive(index, control, pending, request_id)
+                except TimeoutError:
+                    self.metrics.pop(index, None)
+                except (OSError, ValueError):
+                    continue
+
+    def render_prometheus(self) -> bytes:
+        # Scrapes pull fresh numbers; the histograms taken here join the next summary.
+        self.collect()
+        merged = TrafficMetrics(MISMATCH_WINDOW_SECONDS)
+        for snapshot in list(self.metrics.values()):
+            merged.merge(snapshot)
+        return merged.render_prometheus()
+
+    def summarize(self) -> None:
+        totals: dict[str, int] = {}
+        for counters in self.credentials.values():
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+        summarize(totals)
+
+    def run(self) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_args: STOP.set())
+        for index in range(self.count):
+            self.spawn(index)
+        if METRICS_PORT:
+            serve_metrics(METRICS_PORT, self.render_prometheus)
+        while not STOP.wait(SUMMARY_SECONDS):
+            self.collect()
+            self.summarize()
+            if all(process.poll() is not None for process, *_rest in self._workers):
+                break
+        self.stop()
+        self.summarize()
+
+    def stop(self) -> None:
+        for process, *_rest in self._workers:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.drain_seconds
+        for index, (process, control, pending) in enumerate(self._workers):
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            # Whatever the worker sent on its way out is still buffered in the socket.
+            with self._lock:
+                try:
+                    self.receive(index, control, pending, b"final")
+                except (OSError, ValueError):
+                    pass
+                control.close()
+
+
+def main() -> None:
+    control_fd = os.environ.get("TRAFFIC_CONTROL_FD")
+    if control_fd is None and WORKERS > 1:
+        Coordinator(WORKERS, DRAIN_SECONDS).run()
+        return
+    index = int(os.environ.get("TRAFFIC_WORKER_INDEX", "0"))
+    count = int(os.environ.get("TRAFFIC_WORKER_COUNT", "1"))
+    signal.signal(signal.SIGTERM, lambda *_args: STOP.set())
+    if control_fd is not None:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        control = WorkerControl(int(control_fd))
+        generate(index, count, int(SEED) + index if SEED else None)
+        control.close()
+        return
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT, METRICS.render_prometheus)
+    stop = threading.Event()
+    threading.Thread(target=summarize_every, args=(SUMMARY_SECONDS, stop), daemon=True).start()
+    generate(index, count, int(SEED) if SEED else None)
+    stop.set()
+    summarize()
+
+
 if __name__ == "__main__":
-    for count, profile in enumerate(cycle(PROFILES), start=1):
-        send(event(count, profile))
-        time.sleep(INTERVAL)
+    main()
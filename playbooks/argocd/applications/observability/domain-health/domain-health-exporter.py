@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
+import heapq
 import json
 import logging
 import math
 import os
+import random
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.error import HTTPError, URLError
@@ -17,26 +20,24 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s %(message)s",
 )
 
-DOMAIN_NAME = os.environ["DOMAIN_NAME"]
+DOMAINS_FILE = os.getenv("DOMAINS_FILE", "")
 CHECK_INTERVAL_SECONDS = int(os.getenv("CHECK_INTERVAL_SECONDS", "21600"))
+CHECK_JITTER_SECONDS = float(os.getenv("CHECK_JITTER_SECONDS", "30"))
+MAX_CONCURRENT_DOMAINS = int(os.getenv("MAX_CONCURRENT_DOMAINS", "4"))
 HTTP_PORT = int(os.getenv("HTTP_PORT", "8080"))
+CHECK_TIMEOUT_SECONDS = float(os.getenv("CHECK_TIMEOUT_SECONDS", "20"))
+RUN_BUDGET_SECONDS = float(os.getenv("RUN_BUDGET_SECONDS", "45"))
 CLOUDFLARE_API_TOKEN = os.environ["CLOUDFLARE_API_TOKEN"]
-HEALTHCHECKS_PING_URL = os.environ["HEALTHCHECKS_PING_URL"]
-EXPECTED_NAMESERVERS = sorted(
-    ns.strip().rstrip(".").lower()
-    for ns in os.environ["EXPECTED_NAMESERVERS"].split(",")
-    if ns.strip()
-)
+HEALTHCHECKS_PING_URL = os.getenv("HEALTHCHECKS_PING_URL", "")
 USER_AGENT = "soyspray-domain-health/1.0"
 
-if not EXPECTED_NAMESERVERS:
-    raise RuntimeError("EXPECTED_NAMESERVERS must not be empty")
-
 
 METRIC_HELP = {
     "domain_health_check_success": "Whether the named check completed successfully.",
     "domain_health_last_check_timestamp_seconds": "Unix timestamp of the most recent check attempt.",
     "domain_health_last_success_timestamp_seconds": "Unix timestamp of the most recent successful check.",
+    "domain_health_check_duration_seconds": "Seconds until the named check had its data, up to its deadline.",
+    "domain_health_source_duration_seconds": "Seconds the named data source fetch took, up to its deadline.",
     "domain_health_rdap_expiry_timestamp_seconds": "Unix timestamp of the domain RDAP expiry date.",
     "domain_health_rdap_expiry_days": "Remaining whole days until domain expiry.",
     "domain_health_cloudflare_zone_exists": "Whether the Cloudflare zone exists.",
@@ -46,28 +47,58 @@ METRIC_HELP = {
 }
 
 
+class Domain:
+    # Slots keep the per-domain cost to a few fields, since one pod may watch hundreds.
+    __slots__ = ("name", "interval", "expected_nameservers", "ping_url")
+
+    def __init__(self, name, interval, expected_nameservers, ping_url=""):
+        if not expected_nameservers:
+            raise RuntimeError(f"{name}: expected nameservers must not be empty")
+        self.name = name
+        self.interval = interval
+        self.expected_nameservers = expected_nameservers
+        self.ping_url = ping_url
+
+
 class MetricsState:
     def __init__(self):
         self._lock = threading.Lock()
         self._samples = {}
-        self._last_run_ok = False
-        self._last_run_finished = 0.0
+        self._runs = {}
 
     def set_metric(self, name, labels, value):
         key = (name, tuple(sorted(labels.items())))
         with self._lock:
             self._samples[key] = float(value)
 
+    def watch(self, domains):
+        with self._lock:
+            now = time.time()
+            for domain in domains:
+                self._runs[domain.name] = (now, None, domain.interval)
+
     def get_health(self):
+        # Liveness: every domain has finished a run, passed or failed, within twice
+        # its interval of the last one (or of startup). Check results are metrics.
+        with self._lock:
+            now = time.time()
+            return bool(self._runs) and all(
+                (now - (finished or watched)) < (interval * 2)
+                for watched, finished, interval in self._runs.values()
+            )
+
+    def get_ready(self):
+        # Readiness: every domain has been run once, so /metrics has data for it.
         with self._lock:
-            if self._last_run_finished == 0:
-                return False
-            return self._last_run_ok and (time.time() - self._last_run_finished) < (CHECK_INTERVAL_SECONDS * 2)
+            return bool(self._runs) and all(
+                finished is not None for _watched, finished, _interval in self._runs.values()
+            )
 
-    def finish_run(self, ok):
+    def finish_run(self, domain):
         with self._lock:
-            self._last_run_ok = ok
-            self._last_run_finished = time.time()
+            now = time.time()
+            watched = self._runs.get(domain.name, (now,))[0]
+            self._runs[domain.name] = (watched, now, domain.interval)
 
     def render_prometheus(self):
         with self._lock:
@@ -95,7 +126,7 @@ class MetricsState:
 STATE = MetricsState()
 
 
-def request_json(url, headers=None):
+def request_json(url, headers=None, timeout=CHECK_TIMEOUT_SECONDS):
     req = Request(
         url,
         headers={
@@ -104,7 +135,7 @@ def request_json(url, headers=None):
             **(headers or {}),
         },
     )
-    with urlopen(req, timeout=20) as response:
+    with urlopen(req, timeout=timeout) as response:
         return json.load(response)
 
 
@@ -143,39 +174,88 @@ def normalize_nameservers(values):
     return sorted(str(value).strip().rstrip(".").lower() for value in values if str(value).strip())
 
 
-def update_check_status(check_name, ok, now_ts):
-    labels = {"domain": DOMAIN_NAME, "check": check_name}
+def load_domains():
+    if DOMAINS_FILE:
+        with open(DOMAINS_FILE, encoding="utf-8") as handle:
+            entries = json.load(handle)["domains"]
+    else:
+        entries = [
+            {
+                "name": os.environ["DOMAIN_NAME"],
+                "expected_nameservers": os.environ["EXPECTED_NAMESERVERS"].split(","),
+            }
+        ]
+
+    domains = []
+    for entry in entries:
+        domains.append(
+            Domain(
+                entry["name"].strip().rstrip(".").lower(),
+                int(entry.get("interval_seconds", CHECK_INTERVAL_SECONDS)),
+                normalize_nameservers(entry["expected_nameservers"]),
+                entry.get("healthchecks_ping_url", HEALTHCHECKS_PING_URL),
+            )
+        )
+    names = [domain.name for domain in domains]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise RuntimeError(f"domains listed more than once: {', '.join(duplicates)}")
+    if not domains:
+        raise RuntimeError("no domains to check")
+    return domains
+
+
+def update_check_status(domain, check_name, ok, now_ts, duration=None):
+    labels = {"domain": domain.name, "check": check_name}
     STATE.set_metric("domain_health_check_success", labels, 1 if ok else 0)
+    if duration is not None:
+        STATE.set_metric("domain_health_check_duration_seconds", labels, duration)
     STATE.set_metric("domain_health_last_check_timestamp_seconds", labels, now_ts)
     if ok:
         STATE.set_metric("domain_health_last_success_timestamp_seconds", labels, now_ts)
 
 
-def check_rdap(now_ts):
-    payload = request_json(f"https://rdap.org/domain/{quote(DOMAIN_NAME)}")
-    expiry_ts = extract_rdap_expiry_timestamp(payload)
-    expiry_days = math.floor((expiry_ts - now_ts) / 86400)
-    labels = {"domain": DOMAIN_NAME}
-    STATE.set_metric("domain_health_rdap_expiry_timestamp_seconds", labels, expiry_ts)
-    STATE.set_metric("domain_health_rdap_expiry_days", labels, expiry_days)
+def fetch_rdap(domain, timeout):
+    return request_json(f"https://rdap.org/domain/{quote(domain.name)}", timeout=timeout)
 
 
-def check_cloudflare(now_ts):
+def fetch_cloudflare_zones(domain, timeout):
     headers = {"Authorization": f"Bearer {CLOUDFLARE_API_TOKEN}"}
     payload = request_json(
-        f"https://api.cloudflare.com/client/v4/zones?name={quote(DOMAIN_NAME)}",
+        f"https://api.cloudflare.com/client/v4/zones?name={quote(domain.name)}",
         headers=headers,
+        timeout=timeout,
     )
     if not payload.get("success", False):
         raise RuntimeError(f"Cloudflare API error: {payload}")
+    return payload
+
+
+def fetch_public_ns(domain, timeout):
+    return request_json(
+        f"https://dns.google/resolve?name={quote(domain.name)}&type=NS",
+        timeout=timeout,
+    )
+
 
-    zone = None
+def find_zone(domain, payload):
     for candidate in payload.get("result", []):
-        if str(candidate.get("name", "")).lower() == DOMAIN_NAME.lower():
-            zone = candidate
-            break
+        if str(candidate.get("name", "")).lower() == domain.name:
+            return candidate
+    return None
+
+
+def check_rdap(domain, now_ts, rdap):
+    expiry_ts = extract_rdap_expiry_timestamp(rdap)
+    expiry_days = math.floor((expiry_ts - now_ts) / 86400)
+    labels = {"domain": domain.name}
+    STATE.set_metric("domain_health_rdap_expiry_timestamp_seconds", labels, expiry_ts)
+    STATE.set_metric("domain_health_rdap_expiry_days", labels, expiry_days)
 
-    labels = {"domain": DOMAIN_NAME}
+
+def check_cloudflare_zone(domain, now_ts, zones):
+    zone = find_zone(domain, zones)
+    labels = {"domain": domain.name}
     STATE.set_metric("domain_health_cloudflare_zone_exists", labels, 1 if zone else 0)
     if not zone:
         return
@@ -185,62 +265,178 @@ def check_cloudflare(now_ts):
         labels,
         1 if str(zone.get("status", "")).lower() == "active" else 0,
     )
+
+
+def check_cloudflare_nameservers(domain, now_ts, zones):
+    zone = find_zone(domain, zones)
+    if not zone:
+        return
+
     nameservers = normalize_nameservers(zone.get("name_servers", []))
     STATE.set_metric(
         "domain_health_cloudflare_nameservers_match",
-        labels,
-        1 if nameservers == EXPECTED_NAMESERVERS else 0,
+        {"domain": domain.name},
+        1 if nameservers == domain.expected_nameservers else 0,
     )
 
 
-def check_public_dns(now_ts):
-    payload = request_json(f"https://dns.google/resolve?name={quote(DOMAIN_NAME)}&type=NS")
-    answers = payload.get("Answer", [])
+def check_public_dns(domain, now_ts, public_ns):
+    answers = public_ns.get("Answer", [])
     nameservers = normalize_nameservers(answer.get("data", "") for answer in answers)
-    labels = {"domain": DOMAIN_NAME}
+    labels = {"domain": domain.name}
     STATE.set_metric(
         "domain_health_public_dns_nameservers_match",
         labels,
-        1 if nameservers == EXPECTED_NAMESERVERS else 0,
+        1 if nameservers == domain.expected_nameservers else 0,
     )
 
 
-def ping_healthchecks(suffix=""):
-    url = HEALTHCHECKS_PING_URL.rstrip("/") + suffix
+def ping_healthchecks(ping_url, suffix=""):
+    url = ping_url.rstrip("/") + suffix
     req = Request(url, headers={"User-Agent": USER_AGENT})
     with urlopen(req, timeout=10) as response:
         response.read()
 
 
-def run_checks_forever():
-    while True:
-        now_ts = time.time()
-        overall_ok = True
-        checks = {
-            "rdap": check_rdap,
-            "cloudflare_zone": check_cloudflare,
-            "cloudflare_nameservers": check_cloudflare,
-            "public_dns_nameservers": check_public_dns,
-        }
+# Data sources are fetched at most once per run and shared by every check that
+# names them. Checks only evaluate what was fetched, so adding one costs no calls.
+SOURCES = {
+    "rdap": fetch_rdap,
+    "cloudflare_zones": fetch_cloudflare_zones,
+    "public_ns": fetch_public_ns,
+}
+
+CHECKS = {
+    "rdap": (("rdap",), check_rdap),
+    "cloudflare_zone": (("cloudflare_zones",), check_cloudflare_zone),
+    "cloudflare_nameservers": (("cloudflare_zones",), check_cloudflare_nameservers),
+    "public_dns_nameservers": (("public_ns",), check_public_dns),
+}
 
-        for check_name, check_fn in checks.items():
+
+def fetch_sources(domain, sources, names):
+    # Sources are fetched side by side, so this takes as long as the slowest one. Each
+    # gets CHECK_TIMEOUT_SECONDS, cut short by what is left of RUN_BUDGET_SECONDS.
+    started = time.monotonic()
+    budget_end = started + RUN_BUDGET_SECONDS
+    durations = {}
+
+    def timed(name, fetch, domain, timeout):
+        begun = time.monotonic()
+        try:
+            return fetch(domain, timeout)
+        finally:
+            durations[name] = time.monotonic() - begun
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="domain-source")
+    futures = {}
+    for name in names:
+        timeout = max(0.0, min(CHECK_TIMEOUT_SECONDS, budget_end - time.monotonic()))
+        future = executor.submit(timed, name, sources[name], domain, timeout)
+        futures[name] = (future, time.monotonic() + timeout)
+
+    results = {}
+    for name, (future, deadline) in futures.items():
+        try:
+            results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logging.error("source timed out: %s: %s", domain.name, name)
+        except Exception as exc:  # noqa: BLE001
+            logging.exception("source failed: %s: %s: %s", domain.name, name, exc)
+        durations.setdefault(name, time.monotonic() - started)
+        STATE.set_metric(
+            "domain_health_source_duration_seconds",
+            {"domain": domain.name, "source": name},
+            durations[name],
+        )
+    # A timed-out fetch keeps its thread until urlopen gives up; the run does not wait.
+    executor.shutdown(wait=False, cancel_futures=True)
+    return results, durations
+
+
+def run_checks(domain, checks, sources, now_ts):
+    started = time.monotonic()
+    names = sorted({name for needs, _check_fn in checks.values() for name in needs})
+    results, durations = fetch_sources(domain, sources, names)
+
+    overall_ok = True
+    for check_name, (needs, check_fn) in checks.items():
+        ok = False
+        missing = [name for name in needs if name not in results]
+        if missing:
+            logging.error(
+                "check failed: %s: %s: no data from %s", domain.name, check_name, ", ".join(missing)
+            )
+        else:
             try:
-                check_fn(now_ts)
-                update_check_status(check_name, True, now_ts)
-                logging.info("check succeeded: %s", check_name)
+                check_fn(domain, now_ts, *(results[name] for name in needs))
+                ok = True
+                logging.info("check succeeded: %s: %s", domain.name, check_name)
             except Exception as exc:  # noqa: BLE001
-                overall_ok = False
-                update_check_status(check_name, False, now_ts)
-                logging.exception("check failed: %s: %s", check_name, exc)
+                logging.exception("check failed: %s: %s: %s", domain.name, check_name, exc)
+        overall_ok = overall_ok and ok
+        duration = max((durations[name] for name in needs), default=0.0)
+        update_check_status(domain, check_name, ok, now_ts, duration)
 
-        update_check_status("overall", overall_ok, now_ts)
-        try:
-            ping_healthchecks("" if overall_ok else "/fail")
-        except (HTTPError, URLError) as exc:
-            logging.warning("healthchecks ping failed: %s", exc)
+    update_check_status(domain, "overall", overall_ok, now_ts, time.monotonic() - started)
+    return overall_ok
 
-        STATE.finish_run(overall_ok)
-        time.sleep(CHECK_INTERVAL_SECONDS)
+
+def run_domain(domain):
+    try:
+        overall_ok = run_checks(domain, CHECKS, SOURCES, time.time())
+        if domain.ping_url:
+            try:
+                ping_healthchecks(domain.ping_url, "" if overall_ok else "/fail")
+            except (HTTPError, URLError) as exc:
+                logging.warning("healthchecks ping failed: %s: %s", domain.name, exc)
+    finally:
+        STATE.finish_run(domain)
+
+
+class Scheduler:
+    """Run every domain on its own interval from a shared pool of run slots.
+
+    A heap holds each domain's next due time. First runs are spread over
+    `jitter_seconds` and every later run is pushed back by up to that much again,
+    so domains started together drift apart. At most `concurrency` domains are
+    checked at once, which keeps the registries' request rate bounded.
+    """
+
+    def __init__(self, domains, run, concurrency, jitter_seconds, rng=None):
+        self._run = run
+        self._jitter_seconds = jitter_seconds
+        self._rng = rng or random.Random()
+        self._condition = threading.Condition()
+        now = time.monotonic()
+        self._heap = [
+            (now + self._rng.uniform(0, jitter_seconds), index, domain)
+            for index, domain in enumerate(domains)
+        ]
+        heapq.heapify(self._heap)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="domain-run")
+
+    def _run_and_reschedule(self, index, domain):
+        try:
+            self._run(domain)
+        except Exception as exc:  # noqa: BLE001
+            logging.exception("domain run failed: %s: %s", domain.name, exc)
+        due = time.monotonic() + domain.interval + self._rng.uniform(0, self._jitter_seconds)
+        with self._condition:
+            heapq.heappush(self._heap, (due, index, domain))
+            self._condition.notify()
+
+    def run_forever(self, stop):
+        while not stop.is_set():
+            with self._condition:
+                wait = self._heap[0][0] - time.monotonic() if self._heap else 1.0
+                if wait > 0:
+                    # Bounded so a set `stop` is noticed without a notify.
+                    self._condition.wait(min(wait, 1.0))
+                    continue
+                _due, index, domain = heapq.heappop(self._heap)
+            self._executor.submit(self._run_and_reschedule, index, domain)
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 
 class Handler(BaseHTTPRequestHandler):
@@ -254,9 +450,13 @@ class Handler(BaseHTTPRequestHandler):
             self.wfile.write(payload)
             return
 
-        if self.path == "/healthz":
-            status = 200 if STATE.get_health() else 503
-            payload = b"ok\n" if status == 200 else b"stale\n"
+        if self.path in ("/healthz", "/readyz"):
+            if self.path == "/healthz":
+                status = 200 if STATE.get_health() else 503
+                payload = b"ok\n" if status == 200 else b"stale\n"
+            else:
+                status = 200 if STATE.get_ready() else 503
+                payload = b"ok\n" if status == 200 else b"waiting for first run\n"
             self.send_response(status)
             self.send_header("Content-Type", "text/plain; charset=utf-8")
             self.send_header("Content-Length", str(len(payload)))
@@ -272,10 +472,13 @@ class Handler(BaseHTTPRequestHandler):
 
 
 def main():
-    worker = threading.Thread(target=run_checks_forever, daemon=True)
+    domains = load_domains()
+    STATE.watch(domains)
+    scheduler = Scheduler(domains, run_domain, MAX_CONCURRENT_DOMAINS, CHECK_JITTER_SECONDS)
+    worker = threading.Thread(target=scheduler.run_forever, args=(threading.Event(),), daemon=True)
     worker.start()
     server = ThreadingHTTPServer(("0.0.0.0", HTTP_PORT), Handler)
-    logging.info("starting exporter on :%s for domain %s", HTTP_PORT, DOMAIN_NAME)
+    logging.info("starting exporter on :%s for %d domains", HTTP_PORT, len(domains))
     server.serve_forever()
 
 
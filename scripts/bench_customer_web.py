@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Compare customer-web response paths on synthetic payloads."""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import http.client
+import importlib.util
+import io
+import json
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+PAGE_LOAD = ("/", "/styles.css", "/app.js", "/api/cards")
+SERVER = Path(__file__).resolve().parents[1] / "kubernetes/banklab/customer-web/app/server.py"
+
+
+def load_server():
+    os.environ.setdefault("CARDS_API_KEY", "bench")
+    spec = importlib.util.spec_from_file_location("banklab_server", SERVER)
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader
+    spec.loader.exec_module(module)
+    return module
+
+
+def card_payload(count: int) -> bytes:
+    cards = [
+        {
+            "id": f"card-{index:06d}",
+            "name": "Everyday debit",
+            "last4": f"{index % 10000:04d}",
+            "status": "active",
+            "available": 1850.75,
+            "currency": "NZD",
+        }
+        for index in range(count)
+    ]
+    return json.dumps({"cards": cards}, separators=(",", ":")).encode()
+
+
+def measure(render, raw: bytes, rounds: int) -> tuple[float, int]:
+    tracemalloc.start()
+    render(raw)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        render(raw)
+    return (time.perf_counter() - started) / rounds, peak
+
+
+def passthrough(args: argparse.Namespace) -> None:
+    server = load_server()
+    trace = {"status": 200, "request_id": "bench", "elapsed_ms": 3, "headers": {}}
+
+    def parsed(raw: bytes) -> bytes:
+        data = json.loads(raw.decode("utf-8", errors="replace"))
+        return json.dumps({"ok": True, "data": data, "trace": trace}).encode()
+
+    def spliced(raw: bytes) -> bytes:
+        data = server.passthrough_json(raw)
+        return server.json_body({"ok": True, "data": data, "trace": trace})
+
+    print(f"{'cards':>8} {'bytes':>10} {'path':>8} {'ms/op':>8} {'peak KiB':>9}")
+    for count in args.cards:
+        raw = card_payload(count)
+        for name, render in (("parsed", parsed), ("spliced", spliced)):
+            seconds, peak = measure(render, raw, args.rounds)
+            print(f"{count:>8} {len(raw):>10} {name:>8} {seconds * 1000:>8.3f} {peak / 1024:>9.1f}")
+
+
+def page_loads(port: int, loads: int) -> float:
+    client = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    started = time.perf_counter()
+    for _ in range(loads):
+        for path in PAGE_LOAD:
+            client.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            client.getresponse().read()
+    client.close()
+    return time.perf_counter() - started
+
+
+def keepalive(args: argparse.Namespace) -> None:
+    server = load_server()
+    # Keep Kong out of the measurement: only the inbound connection handling differs.
+    server.serve_cards = lambda path, deadline: {"ok": True, "data": {"cards": []}}
+
+    class CountingServer(server.DrainingHTTPServer):
+        accepted = 0
+
+        def get_request(self):
+            CountingServer.accepted += 1
+            return super().get_request()
+
+    class Http10Handler(server.Handler):
+        protocol_version = "HTTP/1.0"
+
+    print(f"{'protocol':>9} {'loads':>6} {'conns/load':>11} {'ms/load':>8}")
+    for handler in (Http10Handler, server.Handler):
+        CountingServer.accepted = 0
+        httpd = CountingServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = page_loads(httpd.server_port, args.loads)
+            httpd.shutdown()
+            httpd.server_close()
+        print(
+            f"{handler.protocol_version:>9} {args.loads:>6} "
+            f"{CountingServer.accepted / args.loads:>11.2f} {seconds / args.loads * 1000:>8.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("passthrough", help="parse and re-encode versus raw splice")
+    bench.add_argument("--cards", type=int, nargs="+", default=[10, 1000, 20000])
+    bench.add_argument("--rounds", type=int, default=20)
+    bench.set_defaults(run=passthrough)
+    bench = commands.add_parser("keepalive", help="inbound connections per page load")
+    bench.add_argument("--loads", type=int, default=200)
+    bench.set_defaults(run=keepalive)
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,25 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import contextlib
+import hashlib
+import hmac
+import http.client
 import importlib.util
+import io
+import itertools
+import json
+import math
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import pytest
@@ -30,6 +49,757 @@ def traffic(monkeypatch):
     return load_module("banklab_traffic", ROOT / "kubernetes/banklab/customer-web/app/traffic.py")
 
 
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("CARDS_API_KEY", "test-key")
+    return load_module("banklab_server", ROOT / "kubernetes/banklab/customer-web/app/server.py")
+
+
+@pytest.fixture
+def upstream():
+    class CardsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        connections: set[int] = set()
+
+        def log_message(self, *_args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self.connections.add(self.client_address[1])
+            status = 200 if self.headers.get("apikey") else 401
+            body = b'{"cards":[{"last4":"4242"}]}' if status == 200 else b'{"message":"no key"}'
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("x-kong-proxy-latency", "1")
+            self.send_header("x-kong-upstream-latency", "2")
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), CardsHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_call_cards_reuses_pooled_upstream_connection(server, upstream, monkeypatch) -> None:
+    monkeypatch.setattr(server, "KONG_PROXY_URL", f"http://127.0.0.1:{upstream.server_port}")
+
+    first = server.call_cards(include_key=True)
+    second = server.call_cards(include_key=False)
+
+    assert first["ok"] is True
+    assert first["data"] == b'{"cards":[{"last4":"4242"}]}'
+    assert first["trace"]["headers"]["x-kong-upstream-latency"] == "2"
+    assert second["expected_rejection"] is True
+    assert len(upstream.RequestHandlerClass.connections) == 1
+    stats = server.UPSTREAM_POOL.stats()
+    assert (stats["hits"], stats["misses"], stats["open"], stats["idle"]) == (1, 1, 1, 1)
+
+
+def test_connection_pool_retries_once_after_reset_on_reused_socket(server) -> None:
+    pool = server.ConnectionPool(max_per_host=1, idle_seconds=30)
+    attempts = []
+
+    class ResetConnection:
+        sock = None
+        timeout = None
+
+        def request(self, *_args, **_kwargs) -> None:
+            attempts.append("reused")
+            raise ConnectionResetError("reset by peer")
+
+        def close(self) -> None:
+            pass
+
+    class FreshConnection(ResetConnection):
+        def request(self, *_args, **_kwargs) -> None:
+            attempts.append("fresh")
+            raise ConnectionRefusedError("refused")
+
+    acquired = iter([(ResetConnection(), True), (FreshConnection(), False)])
+    pool._open[("http", "kong", 80)] = 2
+    pool._idle[("http", "kong", 80)] = server.deque()
+    pool._acquire = lambda *_args: next(acquired)
+
+    with pytest.raises(ConnectionRefusedError):
+        pool.request("http://kong/cards/v1/cards", {}, timeout=1)
+
+    assert attempts == ["reused", "fresh"]
+    assert pool.stats()["retries"] == 1
+    assert pool.stats()["open"] == 0
+
+
+def raw_get(port: int, request: bytes) -> bytes:
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as client:
+        client.sendall(request)
+        chunks = []
+        while chunk := client.recv(65536):
+            chunks.append(chunk)
+    return re.sub(rb"Date: [^\r]+", b"Date: -", b"".join(chunks))
+
+
+@pytest.mark.parametrize(
+    "request_bytes",
+    (
+        b"GET / HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n",
+        b"HEAD /styles.css HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n",
+        b"GET /ready HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n",
+        b"GET /missing HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n",
+    ),
+)
+def test_async_engine_matches_threaded_response_bytes(server, request_bytes: bytes) -> None:
+    httpd = server.ThreadingHTTPServer(("127.0.0.1", 0), server.Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        threaded = raw_get(httpd.server_port, request_bytes)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    async def fetch_from_async_engine() -> bytes:
+        engine = server.AsyncServer(max_concurrency=2)
+        listener = await asyncio.start_server(engine.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            return await asyncio.to_thread(raw_get, port, request_bytes)
+
+    assert asyncio.run(fetch_from_async_engine()) == threaded
+
+
+def keep_alive_session(port: int) -> list[tuple[int, bool, int]]:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    seen = []
+    for method, path in (("GET", "/ready"), ("HEAD", "/styles.css"), ("GET", "/missing")):
+        connection.request(method, path)
+        local_port = connection.sock.getsockname()[1]
+        response = connection.getresponse()
+        response.read()
+        seen.append((response.status, response.will_close, local_port))
+    connection.close()
+    return seen
+
+
+@pytest.mark.parametrize("engine", ("threading", "asyncio"))
+def test_keep_alive_reuses_one_connection_until_the_request_cap(
+    server, monkeypatch, engine
+) -> None:
+    monkeypatch.setattr(server, "KEEPALIVE_MAX_REQUESTS", 3)
+    if engine == "threading":
+        httpd = server.DrainingHTTPServer(("127.0.0.1", 0), server.Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            seen = keep_alive_session(httpd.server_port)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+    else:
+
+        async def session() -> list[tuple[int, bool, int]]:
+            engine_server = server.AsyncServer(max_concurrency=1)
+            listener = await asyncio.start_server(engine_server.handle, "127.0.0.1", 0)
+            async with listener:
+                return await asyncio.to_thread(
+                    keep_alive_session, listener.sockets[0].getsockname()[1]
+                )
+
+        seen = asyncio.run(session())
+
+    assert [(status, closes) for status, closes, _port in seen] == [
+        (200, False),
+        (200, False),
+        (404, True),
+    ]
+    assert len({port for _status, _closes, port in seen}) == 1
+
+
+def test_draining_server_releases_idle_keep_alive_connections(server) -> None:
+    httpd = server.DrainingHTTPServer(("127.0.0.1", 0), server.Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    client = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=5)
+    client.request("GET", "/ready")
+    assert client.getresponse().read() == b'{"ready": true}'
+
+    started = time.monotonic()
+    httpd.shutdown()
+    httpd.server_close()
+
+    assert time.monotonic() - started < 2
+    assert client.sock.recv(1) == b""
+    client.close()
+
+
+def test_threaded_server_caps_connections(server, monkeypatch) -> None:
+    entered, release = threading.Event(), threading.Event()
+    answer = server.local_response
+
+    def slow_response(path: str, request_headers) -> tuple[int, list, bytes]:
+        if path == "/slow":
+            entered.set()
+            release.wait(5)
+        return answer(path, request_headers)
+
+    monkeypatch.setattr(server, "local_response", slow_response)
+    httpd = server.DrainingHTTPServer(("127.0.0.1", 0), server.Handler, max_connections=1)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        parked = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=5)
+        parked.request("GET", "/ready")
+        assert parked.getresponse().read() == b'{"ready": true}'
+        while not httpd._idle:
+            time.sleep(0.01)
+
+        busy = http.client.HTTPConnection("127.0.0.1", httpd.server_port, timeout=5)
+        busy.request("GET", "/slow")
+        assert entered.wait(5)
+        assert parked.sock.recv(1) == b""
+
+        shed = raw_get(
+            httpd.server_port, b"GET /ready HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n"
+        )
+        release.set()
+        assert busy.getresponse().status == 404
+    finally:
+        release.set()
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert shed.startswith(b"HTTP/1.1 503")
+    assert b"\r\nRetry-After: 1\r\n" in shed
+    assert "banklab_web_connections_shed_total 1" in server.METRICS.render_prometheus().decode()
+
+
+def test_requests_with_a_body_end_the_kept_alive_connection(server) -> None:
+    httpd = server.DrainingHTTPServer(("127.0.0.1", 0), server.Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        response = raw_get(
+            httpd.server_port, b"GET /ready HTTP/1.1\r\nHost: web\r\nContent-Length: 2\r\n\r\n{}"
+        )
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert b"\r\nConnection: close\r\n" in response
+
+
+def test_access_log_samples_2xx_and_keeps_errors(server, monkeypatch) -> None:
+    stream = io.StringIO()
+    monkeypatch.setattr(server, "ACCESS_LOG", server.AccessLog(16, 16, 0, stream))
+    httpd = server.DrainingHTTPServer(("127.0.0.1", 0), server.Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        raw_get(httpd.server_port, b"GET /ready HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n")
+        raw_get(httpd.server_port, b"GET /nope HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    server.ACCESS_LOG.close()
+
+    (line,) = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert line["event"] == "access"
+    assert (line["method"], line["path"], line["status"]) == ("GET", "/nope", 404)
+    assert line["bytes"] == len(b'{"error": "not-found"}')
+    assert line["ms"] >= 0
+    assert line["remote"] == "127.0.0.1"
+
+
+def test_access_log_drops_lines_when_the_writer_falls_behind(server) -> None:
+    writing, release = threading.Event(), threading.Event()
+
+    class SlowStream(io.StringIO):
+        def write(self, text: str) -> int:
+            writing.set()
+            release.wait(5)
+            return super().write(text)
+
+    stream = SlowStream()
+    access_log = server.AccessLog(1, 16, 1, stream)
+    access_log.log({"path": "/first", "status": 200})
+    assert writing.wait(5)
+    access_log.log({"path": "/queued", "status": 500})
+    access_log.log({"path": "/dropped", "status": 500})
+    release.set()
+    access_log.close()
+
+    assert [json.loads(line)["path"] for line in stream.getvalue().splitlines()] == [
+        "/first",
+        "/queued",
+    ]
+    assert "banklab_web_access_log_dropped_total 1" in server.METRICS.render_prometheus().decode()
+
+
+def test_async_engine_calls_kong_without_blocking(server, upstream, monkeypatch) -> None:
+    monkeypatch.setattr(server, "KONG_PROXY_URL", f"http://127.0.0.1:{upstream.server_port}")
+
+    async def fetch_both() -> list[dict]:
+        return await asyncio.gather(
+            server.call_cards_async(include_key=True),
+            server.call_cards_async(include_key=False),
+        )
+
+    with_key, without_key = asyncio.run(fetch_both())
+
+    assert with_key["ok"] is True
+    assert with_key["data"] == b'{"cards":[{"last4":"4242"}]}'
+    assert with_key["trace"]["headers"]["x-kong-proxy-latency"] == "1"
+    assert without_key["expected_rejection"] is True
+
+
+def test_static_assets_are_served_from_cache_with_gzip_and_etags(server) -> None:
+    status, headers, body = server.local_response("/app.js", {"Accept-Encoding": "br, gzip"})
+    sent = dict(headers)
+
+    assert status == 200
+    assert sent["Content-Encoding"] == "gzip"
+    assert sent["Cache-Control"] == "no-cache"
+    assert sent["Vary"] == "Accept-Encoding"
+    assert sent["X-Frame-Options"] == "DENY"
+    assert server.gzip.decompress(body) == (server.APP_DIR / "app.js").read_bytes()
+
+    status, headers, body = server.local_response(
+        "/app.js", {"Accept-Encoding": "gzip", "If-None-Match": sent["ETag"]}
+    )
+    assert status == 304
+    assert body == b""
+    assert "Content-Length" not in dict(headers)
+
+    status, headers, _body = server.local_response("/app.js", {"Accept-Encoding": "gzip;q=0"})
+    assert status == 200
+    assert "Content-Encoding" not in dict(headers)
+    assert dict(headers)["ETag"] != sent["ETag"]
+
+
+def test_static_cache_reloads_changed_configmap_files(server, tmp_path) -> None:
+    (tmp_path / "index.html").write_text("<p>first</p>")
+    cache = server.StaticCache(tmp_path, {"/": ("index.html", "text/html")}, check_seconds=0)
+    first = cache.get("/").variants["identity"]
+
+    (tmp_path / "index.html").write_text("<p>second release</p>")
+
+    assert cache.get("/").variants["identity"][1] == b"<p>second release</p>"
+    assert cache.get("/").variants["identity"][0] != first[0]
+    assert cache.reloads == 1
+
+
+def test_concurrent_card_requests_share_one_upstream_call(server) -> None:
+    cache = server.ResponseCoalescer(ttl_seconds=0, stale_seconds=0)
+    calls = []
+
+    def load() -> dict:
+        calls.append("kong")
+        while cache.stats()["coalesced"] < 4:
+            threading.Event().wait(0.01)
+        return {"ok": True, "trace": {"status": 200}}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get(("/api/cards", True), load)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert calls == ["kong"]
+    assert sorted(result["trace"]["cache"] for result in results) == ["coalesced"] * 4 + ["miss"]
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 4, "stale": 0, "entries": 0}
+
+
+def test_card_micro_cache_separates_key_modes_and_serves_stale(server, monkeypatch) -> None:
+    cache = server.ResponseCoalescer(ttl_seconds=10, stale_seconds=10)
+    monkeypatch.setattr(server, "CARDS_CACHE", cache)
+    monkeypatch.setattr(
+        server,
+        "call_cards",
+        lambda include_key, _deadline: {
+            "ok": include_key,
+            "trace": {"status": 200 if include_key else 401},
+        },
+    )
+    deadline = server.monotonic() + 5
+
+    assert server.serve_cards("/api/cards", deadline)["trace"]["cache"] == "miss"
+    assert server.serve_cards("/api/cards/without-key", deadline)["ok"] is False
+    assert server.serve_cards("/api/cards", deadline)["ok"] is True
+    assert server.serve_cards("/api/cards", deadline)["trace"]["cache"] == "hit"
+
+    clock = server.monotonic() + 15
+    monkeypatch.setattr(server, "monotonic", lambda: clock)
+    assert server.serve_cards("/api/cards/without-key", deadline)["trace"]["cache"] == "stale"
+    assert cache.stats()["misses"] == 2
+
+
+def test_metrics_expose_route_and_kong_latency_histograms(server, upstream, monkeypatch) -> None:
+    monkeypatch.setattr(server, "KONG_PROXY_URL", f"http://127.0.0.1:{upstream.server_port}")
+    stream = io.StringIO()
+    monkeypatch.setattr(server, "ACCESS_LOG", server.AccessLog(16, 16, 1, stream))
+    httpd = server.ThreadingHTTPServer(("127.0.0.1", 0), server.Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    admin = server.serve_admin(0, server.METRICS.render_prometheus, server.upstream_stats)
+    try:
+        raw_get(
+            httpd.server_port, b"GET /api/cards HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n"
+        )
+        public = raw_get(
+            httpd.server_port, b"GET /metrics HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n"
+        )
+        debug = raw_get(
+            admin.server_port, b"GET /debug/upstream HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        metrics = raw_get(
+            admin.server_port, b"GET /metrics HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n"
+        )
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        admin.shutdown()
+        admin.server_close()
+        server.ACCESS_LOG.close()
+
+    assert public.startswith(b"HTTP/1.1 404")
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(record["path"], record["status"]) for record in records] == [
+        ("/api/cards", 200),
+        ("/metrics", 404),
+    ]
+    assert json.loads(debug.partition(b"\r\n\r\n")[2])["circuits"]["cards"]["state"] == "closed"
+    text = metrics.decode()
+    assert "Content-Type: text/plain; version=0.0.4" in text
+    assert 'banklab_web_requests_total{route="/api/cards",class="2xx"} 1' in text
+    assert 'banklab_web_requests_total{route="other",class="4xx"} 1' in text
+    assert 'banklab_web_requests_in_flight{route="/api/cards"} 0' in text
+    assert 'route="/metrics"' not in text
+    assert 'banklab_web_request_duration_seconds_count{route="/api/cards"} 1' in text
+    assert 'banklab_web_upstream_responses_total{api="cards",class="2xx"} 1' in text
+    assert (
+        'banklab_web_upstream_duration_seconds_bucket{api="cards",component="kong",le="0.001"} 1'
+        in text
+    )
+    assert 'component="upstream",le="0.001"} 0' in text
+    assert 'component="upstream",le="0.005"} 1' in text
+    assert "# TYPE banklab_web_request_duration_seconds histogram" in text
+
+
+def test_circuit_breaker_fails_fast_then_probes_kong(server, monkeypatch) -> None:
+    breaker = server.CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    monkeypatch.setitem(server.BREAKERS, "cards", breaker)
+    calls = []
+
+    def refuse(*_args) -> None:
+        calls.append("kong")
+        raise ConnectionRefusedError("connection refused")
+
+    monkeypatch.setattr(server.UPSTREAM_POOL, "request", refuse)
+    server.call_cards(include_key=True)
+    server.call_cards(include_key=True)
+    rejected = server.call_cards(include_key=True)
+
+    assert len(calls) == 2
+    assert rejected["ok"] is False
+    assert rejected["trace"]["circuit"] == "open"
+    assert rejected["trace"]["retry_after_seconds"] == 10
+    assert breaker.stats()["trips"] == 1
+    assert breaker.stats()["rejected"] == 1
+
+    clock = server.monotonic() + 11
+    monkeypatch.setattr(server, "monotonic", lambda: clock)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record(success=True)
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_card_call_timeout_shrinks_to_remaining_deadline(server, monkeypatch) -> None:
+    timeouts = []
+
+    def capture(_url, _headers, timeout) -> None:
+        timeouts.append(timeout)
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(server.UPSTREAM_POOL, "request", capture)
+    server.call_cards(include_key=True, deadline=server.monotonic() + 1.5)
+    expired = server.call_cards(include_key=True, deadline=server.monotonic() - 0.1)
+
+    assert 1.4 < timeouts[0] <= 1.5
+    assert len(timeouts) == 1
+    assert expired["message"] == "request deadline exceeded"
+
+
+def test_connection_pool_enforces_one_deadline_across_slow_reads(server) -> None:
+    class TrickleHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Length", "10")
+            self.end_headers()
+            for _ in range(10):
+                time.sleep(0.3)
+                with contextlib.suppress(OSError):
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), TrickleHandler)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    pool = server.ConnectionPool(max_per_host=1, idle_seconds=30)
+    started = time.monotonic()
+    try:
+        with pytest.raises(TimeoutError):
+            pool.request(f"http://127.0.0.1:{upstream.server_port}/slow", {}, timeout=1)
+    finally:
+        upstream.shutdown()
+        upstream.server_close()
+
+    assert time.monotonic() - started < 1.5
+    assert pool.stats()["open"] == 0
+
+
+def test_admission_control_sheds_excess_and_prefers_static_routes(server) -> None:
+    admission = server.AdmissionController(limit=1, queue_depth=2, queue_timeout=5)
+    order = []
+
+    def queued(route: str, priority: bool) -> None:
+        assert admission.enter(route, priority)
+        order.append(route)
+        admission.leave()
+
+    assert admission.enter("/api/cards", priority=False)
+    waiters = [
+        threading.Thread(target=queued, args=("/api/cards", False)),
+        threading.Thread(target=queued, args=("/", True)),
+    ]
+    waiters[0].start()
+    while admission._waiting[False] == 0:
+        threading.Event().wait(0.01)
+    waiters[1].start()
+    while admission._waiting[True] == 0:
+        threading.Event().wait(0.01)
+
+    assert admission.enter("/api/cards", priority=False) is False
+    admission.leave()
+    for waiter in waiters:
+        waiter.join(timeout=5)
+
+    assert order == ["/", "/api/cards"]
+    assert 'banklab_web_requests_shed_total{route="/api/cards"} 1' in (
+        server.METRICS.render_prometheus().decode()
+    )
+
+
+def test_shed_requests_get_503_with_retry_after(server, monkeypatch) -> None:
+    monkeypatch.setattr(server.ADMISSION, "enter", lambda *_args, **_kwargs: False)
+    httpd = server.ThreadingHTTPServer(("127.0.0.1", 0), server.Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        response = raw_get(
+            httpd.server_port, b"GET /api/cards HTTP/1.1\r\nHost: web\r\nConnection: close\r\n\r\n"
+        )
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert response.startswith(b"HTTP/1.1 503 Service Unavailable\r\n")
+    assert b"Retry-After: 1\r\n" in response
+    assert b"X-Frame-Options: DENY\r\n" in response
+    assert response.endswith(b'{"error": "overloaded"}')
+
+
+def test_upstream_json_is_spliced_into_the_envelope_unchanged(server) -> None:
+    raw = b'{"cards": [{"name": "Everyday \xc3\xa9", "available": 1850.75}]}'
+    payload = {"ok": True, "data": server.passthrough_json(raw), "trace": {"status": 200}}
+
+    body = server.json_body(payload)
+
+    assert body.endswith(b'"data": ' + raw + b"}")
+    assert json.loads(body) == {
+        "ok": True,
+        "trace": {"status": 200},
+        "data": {"cards": [{"name": "Everyday \u00e9", "available": 1850.75}]},
+    }
+    assert server.json_body({"data": server.passthrough_json(b"[]")}) == b'{"data": []}'
+    assert server.passthrough_json(b"upstream timed out") is None
+    assert server.passthrough_json('{"a": 1}'.encode("utf-16")) is None
+
+
+def test_overview_fans_out_with_its_own_consumer_key(server, upstream, monkeypatch) -> None:
+    monkeypatch.setattr(server, "KONG_PROXY_URL", f"http://127.0.0.1:{upstream.server_port}")
+    monkeypatch.setattr(server, "OVERVIEW_API_KEY", "overview-key")
+    monkeypatch.setattr(server, "CARDS_API_KEY", "")
+
+    result = server.overview(server.monotonic() + 5)
+
+    assert result["ok"] is True
+    assert list(result["apis"]) == ["accounts", "payments", "cards", "customer-profile", "fraud"]
+    assert set(result["apis"]["accounts"]["trace"]) == {
+        "status",
+        "request_id",
+        "elapsed_ms",
+        "headers",
+    }
+
+
+def test_overview_returns_partial_results(server, monkeypatch) -> None:
+    def call(api, _path, _key, _deadline) -> dict:
+        status = 401 if api == "fraud" else 200
+        return {"ok": status == 200, "data": {}, "trace": {"status": status}}
+
+    monkeypatch.setattr(server, "call_kong", call)
+    result = server.overview(server.monotonic() + 5)
+
+    assert result["ok"] is False
+    assert result["partial"] is True
+    assert result["apis"]["fraud"]["trace"]["status"] == 401
+
+
+def test_overview_is_coalesced_and_cached_only_when_kong_answered(server, monkeypatch) -> None:
+    calls = []
+
+    def call(api, _path, _key, _deadline) -> dict:
+        calls.append(api)
+        if len(calls) <= 5 and api == "fraud":
+            return {"ok": False, "message": "timed out", "trace": {}}
+        return {"ok": True, "data": {}, "trace": {"status": 200}}
+
+    monkeypatch.setattr(server, "call_kong", call)
+    cache = server.ResponseCoalescer(30, 0, server.overview_answered)
+    monkeypatch.setattr(server, "OVERVIEW_CACHE", cache)
+    deadline = server.monotonic() + 5
+
+    assert server.serve_overview(deadline)["trace"]["cache"] == "miss"
+    assert server.serve_overview(deadline)["trace"]["cache"] == "miss"
+    assert server.serve_overview(deadline)["trace"]["cache"] == "hit"
+    assert len(calls) == 10
+
+
+def test_overview_latency_tracks_the_slowest_call(server, monkeypatch) -> None:
+    def slow_call(api, _path, _key, _deadline) -> dict:
+        threading.Event().wait(0.3)
+        return {"ok": True, "data": {}, "trace": {"status": 200}}
+
+    monkeypatch.setattr(server, "call_kong", slow_call)
+    started = server.monotonic()
+    result = server.overview(started + 5)
+
+    assert result["ok"] is True
+    assert server.monotonic() - started < 0.9
+
+
+def test_metrics_snapshots_merge_across_workers(server) -> None:
+    workers = [server.MetricsRegistry(server.LATENCY_BUCKETS) for _ in range(2)]
+    for registry, seconds in zip(workers, (0.004, 0.2), strict=True):
+        registry.inc("banklab_web_requests_total", (("route", "/"), ("class", "2xx")))
+        registry.observe("banklab_web_request_duration_seconds", (("route", "/"),), seconds)
+
+    merged = server.MetricsRegistry(server.LATENCY_BUCKETS)
+    for registry in workers:
+        merged.merge(json.loads(json.dumps(registry.snapshot())))
+    text = merged.render_prometheus().decode()
+
+    assert 'banklab_web_requests_total{route="/",class="2xx"} 2' in text
+    assert 'banklab_web_request_duration_seconds_bucket{route="/",le="0.005"} 1' in text
+    assert 'banklab_web_request_duration_seconds_bucket{route="/",le="0.25"} 2' in text
+    assert 'banklab_web_request_duration_seconds_sum{route="/"} 0.204000' in text
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def test_prefork_supervisor_restarts_workers_and_drains() -> None:
+    port, metrics_port = free_port(), free_port()
+    supervisor = subprocess.Popen(
+        [sys.executable, str(ROOT / "kubernetes/banklab/customer-web/app/server.py")],
+        env={
+            **os.environ,
+            "CARDS_API_KEY": "test-key",
+            "APP_PORT": str(port),
+            "APP_WORKERS": "2",
+            "METRICS_PORT": str(metrics_port),
+        },
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert "supervising 2 workers" in supervisor.stdout.readline()
+    started = [json.loads(supervisor.stdout.readline()) for _ in range(2)]
+
+    def scrape() -> str:
+        return raw_get(metrics_port, b"GET /metrics HTTP/1.1\r\nConnection: close\r\n\r\n").decode()
+
+    try:
+        for _ in range(50):
+            try:
+                raw_get(port, b"GET /ready HTTP/1.1\r\nConnection: close\r\n\r\n")
+                break
+            except ConnectionRefusedError:
+                threading.Event().wait(0.1)
+        for _ in range(5):
+            raw_get(port, b"GET /ready HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+        assert "banklab_web_workers 2" in scrape()
+        upstream = raw_get(
+            metrics_port, b"GET /debug/upstream HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        assert set(json.loads(upstream.partition(b"\r\n\r\n")[2])["workers"]) == {"0", "1"}
+        assert 'banklab_web_requests_total{route="/ready",class="2xx"} 6' in scrape()
+
+        os.kill(started[0]["pid"], signal.SIGKILL)
+        for _ in range(50):
+            if "banklab_web_worker_restarts_total 1" in scrape():
+                break
+            threading.Event().wait(0.1)
+        assert "banklab_web_worker_restarts_total 1" in scrape()
+    finally:
+        supervisor.send_signal(signal.SIGTERM)
+        assert supervisor.wait(timeout=15) == 0
+
+
+def test_prefork_supervisor_backs_off_workers_that_keep_crashing(server) -> None:
+    supervisor = server.Supervisor(2, 1, backoff_seconds=0.5, max_backoff_seconds=4)
+
+    assert [supervisor.backoff(0, 0.1) for _ in range(5)] == [0.5, 1.0, 2.0, 4.0, 4.0]
+    assert supervisor.backoff(1, 0.1) == 0.5
+    assert supervisor.backoff(0, 60) == 0.5
+
+
+def test_prefork_supervisor_keeps_a_worker_after_one_slow_reply(server, monkeypatch) -> None:
+    snapshot, stalls = server.METRICS.snapshot, [0.4]
+
+    def slow_once() -> dict:
+        if stalls:
+            time.sleep(stalls.pop())
+        return snapshot()
+
+    monkeypatch.setattr(server.METRICS, "snapshot", slow_once)
+    parent, child = socket.socketpair()
+    worker = threading.Thread(target=server.serve_control, args=(child.detach(), lambda: None))
+    worker.start()
+    supervisor = server.Supervisor(1, 1, control_timeout_seconds=0.2)
+    supervisor._workers[0] = server.WorkerProcess(
+        None, parent, bytearray(), threading.Lock(), time.monotonic()
+    )
+
+    try:
+        assert "banklab_web_workers" not in supervisor.collect().decode()
+        time.sleep(0.3)
+        assert "banklab_web_workers 1" in supervisor.collect().decode()
+        assert "banklab_web_workers 1" in supervisor.collect().decode()
+    finally:
+        parent.close()
+        worker.join(5)
+
+
 def test_traffic_profiles_are_domain_specific(traffic) -> None:
     assert {profile[1] for profile in traffic.PROFILES} == {
         "accounts",
@@ -57,6 +827,114 @@ def test_planned_traffic_scenarios(traffic, counter: int, scenario: str, status:
     assert item["expected"] == status
 
 
+def test_partner_jwt_is_reused_until_shortly_before_expiry(traffic, monkeypatch) -> None:
+    credentials = traffic.Credentials("", check_seconds=0, refresh_seconds=30)
+    now = 1_700_000_000
+    monkeypatch.setattr(traffic.time, "time", lambda: now)
+
+    first = credentials.jwt_token()
+    assert credentials.jwt_token() == first
+    now += traffic.JWT_LIFETIME_SECONDS - 31
+    assert credentials.jwt_token() == first
+    now += 1
+    second = credentials.jwt_token()
+
+    assert second != first
+    assert credentials.counters() == {"jwt_minted": 2, "jwt_reused": 2, "reloads": 0}
+    message, _, signature = second.rpartition(".")
+    expected = hmac.new(b"secret", message.encode(), hashlib.sha256).digest()
+    assert signature == base64.urlsafe_b64encode(expected).rstrip(b"=").decode()
+    assert message.startswith(traffic.JWT_HEADER + ".")
+
+
+def test_credentials_reload_rotated_secret_files(traffic, tmp_path) -> None:
+    (tmp_path / "CARDS_API_KEY").write_text("first-key\n")
+    (tmp_path / "JWT_SECRET").write_text("first-secret")
+    (tmp_path / "..data").mkdir()
+    credentials = traffic.Credentials(str(tmp_path), check_seconds=0, refresh_seconds=30)
+
+    assert credentials.get("CARDS_API_KEY") == "first-key"
+    assert credentials.get("ACCOUNTS_API_KEY") == "test-key"
+    token = credentials.jwt_token()
+    (tmp_path / "CARDS_API_KEY").write_text("rotated-key")
+    (tmp_path / "JWT_SECRET").write_text("rotated-secret")
+
+    assert credentials.get("CARDS_API_KEY") == "rotated-key"
+    assert credentials.jwt_token() != token
+    assert credentials.counters() == {"jwt_minted": 2, "jwt_reused": 0, "reloads": 1}
+
+
+def test_alias_table_matches_weights_with_a_fixed_seed(traffic) -> None:
+    table = traffic.AliasTable({"a": 70, "b": 20, "c": 10, "never": 0})
+    rng = traffic.random.Random(5)
+    draws = [table.sample(rng) for _ in range(20000)]
+
+    assert "never" not in draws
+    assert abs(draws.count("a") / len(draws) - 0.7) < 0.02
+    assert abs(draws.count("c") / len(draws) - 0.1) < 0.02
+    rng = traffic.random.Random(5)
+    assert [table.sample(rng) for _ in range(20000)] == draws
+
+
+def test_shipped_scenario_file_builds_every_planned_scenario(traffic) -> None:
+    engine = traffic.ScenarioEngine.load(
+        str(ROOT / "kubernetes/banklab/customer-web/app/scenarios.json"), seed=11
+    )
+    items = list(itertools.islice(traffic.events(engine.event), 5000))
+    by_scenario = {item["scenario"]: item for item in items}
+
+    assert set(by_scenario) == {
+        "steady",
+        "missing-credential",
+        "unknown-route",
+        "partner",
+        "planned-backend-error",
+    }
+    assert "apikey" not in by_scenario["missing-credential"]["headers"]
+    assert by_scenario["partner"]["headers"]["Authorization"].startswith("Bearer ")
+    assert by_scenario["partner"]["headers"]["Host"] == "api.external.banklab.test"
+    assert by_scenario["planned-backend-error"]["expected"] == 500
+    assert 0.92 < sum(item["scenario"] == "steady" for item in items) / len(items) < 0.96
+
+
+def test_scenario_seed_repeats_each_profile_however_threads_interleave(traffic) -> None:
+    config = {"scenarios": {"a": {}, "b": {}}, "weights": {"a": 1, "b": 1}}
+    first, second = traffic.PROFILES[:2]
+
+    def draws(engine, order) -> dict:
+        drawn: dict[str, list] = {first[0]: [], second[0]: []}
+        for counter, profile in enumerate(order, start=1):
+            drawn[profile[0]].append(engine.event(counter, profile)["scenario"])
+        return drawn
+
+    apart = draws(traffic.ScenarioEngine(config, seed=7), [first] * 40 + [second] * 40)
+    mixed = draws(traffic.ScenarioEngine(config, seed=7), [first, second] * 40)
+
+    assert apart == mixed
+    assert apart[first[0]] != apart[second[0]]
+
+
+def test_scenario_phases_and_profile_overrides(traffic) -> None:
+    engine = traffic.ScenarioEngine(
+        {
+            "scenarios": {"steady": {}, "error": {"path": "/boom", "expect": 500}},
+            "weights": {"steady": 1, "error": 0},
+            "profiles": {"fraud-platform": {"error": 1, "steady": 0}},
+            "phases": [
+                {"name": "calm", "requests": 10},
+                {"name": "burst", "requests": 5, "weights": {"steady": 0, "error": 1}},
+            ],
+        },
+        seed=3,
+    )
+    scenarios = [engine.event(counter, traffic.PROFILES[0])["scenario"] for counter in range(1, 31)]
+
+    assert scenarios == (["steady"] * 10 + ["error"] * 5) * 2
+    assert engine.event(1, traffic.PROFILES[4])["scenario"] == "error"
+    with pytest.raises(ValueError, match="unknown scenarios"):
+        traffic.ScenarioEngine({"scenarios": {"steady": {}}, "weights": {"typo": 1}})
+
+
 def test_traffic_closes_connection_after_request_error(traffic, monkeypatch, capsys) -> None:
     class BrokenConnection:
         closed = False
@@ -89,6 +967,493 @@ def test_traffic_closes_connection_after_request_error(traffic, monkeypatch, cap
     assert '"ok":false' in capsys.readouterr().out
 
 
+def traffic_item(client: str = "test-client") -> dict:
+    return {
+        "client": client,
+        "api": "cards",
+        "path": "/cards/v1/cards",
+        "headers": {"X-Request-ID": "test-request", "apikey": "test-key"},
+        "expected": 200,
+        "scenario": "steady",
+    }
+
+
+@pytest.mark.parametrize(("reuse", "connections"), ((True, 1), (False, 2)))
+def test_traffic_reuses_one_connection_per_profile(
+    traffic, upstream, monkeypatch, capsys, reuse: bool, connections: int
+) -> None:
+    monkeypatch.setattr(traffic, "PROXY", "127.0.0.1")
+    monkeypatch.setattr(traffic, "PROXY_PORT", upstream.server_port)
+    monkeypatch.setattr(traffic, "REUSE_CONNECTIONS", reuse)
+
+    traffic.send(traffic_item())
+    traffic.send(traffic_item())
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record["reused"] for record in records] == [False, reuse]
+    assert all(record["ok"] for record in records)
+    assert len(upstream.RequestHandlerClass.connections) == connections
+
+
+def test_traffic_reconnects_when_a_kept_alive_connection_was_closed(
+    traffic, upstream, monkeypatch, capsys
+) -> None:
+    class ClosedByKong:
+        closed = False
+
+        def request(self, *_args, **_kwargs) -> None:
+            raise http.client.RemoteDisconnected("closed by peer")
+
+        def close(self) -> None:
+            self.closed = True
+
+    stale = ClosedByKong()
+    monkeypatch.setattr(traffic, "PROXY", "127.0.0.1")
+    monkeypatch.setattr(traffic, "PROXY_PORT", upstream.server_port)
+    traffic.CONNECTIONS.give("test-client", stale)
+
+    traffic.send(traffic_item())
+
+    record = json.loads(capsys.readouterr().out)
+    assert (record["ok"], record["reused"], record["error"]) == (True, False, None)
+    assert stale.closed is True
+
+
+def test_latency_histogram_percentiles_stay_within_one_percent(traffic) -> None:
+    histogram = traffic.LatencyHistogram()
+    values = list(range(100, 2_000_000, 997))
+    for value in values:
+        histogram.record(value)
+    histogram.record(10**9)
+
+    for percent in (50, 90, 99):
+        exact = values[math.ceil(len(values) * percent / 100) - 1]
+        assert exact <= histogram.percentile(percent) <= exact * 1.01
+    assert histogram.max_us == histogram.highest_us
+    assert len(histogram.counts) == len(traffic.LatencyHistogram().counts)
+
+
+def test_traffic_summaries_replace_per_request_lines(traffic, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(traffic, "REQUEST_LOG", False)
+    now = traffic.time.monotonic()
+    for index, status in enumerate((200, 200, 200, 503)):
+        traffic.report(traffic_item(), status, now - (index + 1) / 100, None, reused=True)
+    traffic.STATS.flush()
+
+    (summary,) = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert summary["event"] == "banklab-traffic-summary"
+    assert (summary["client"], summary["api"], summary["scenario"]) == (
+        "test-client",
+        "cards",
+        "steady",
+    )
+    assert (summary["count"], summary["ok_ratio"]) == (4, 0.75)
+    assert 10 <= summary["p50_ms"] < summary["p99_ms"] <= summary["max_ms"]
+    traffic.STATS.flush()
+    assert capsys.readouterr().out == ""
+
+
+def test_corrected_latency_backfills_a_stall_without_bursting(traffic, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(traffic, "PROFILES", traffic.PROFILES[:1])
+    monkeypatch.setattr(traffic, "INTERVAL", 0.05)
+    monkeypatch.setattr(traffic, "REQUEST_LOG", False)
+    sent = []
+
+    def stalling_send(item: dict) -> None:
+        started = time.monotonic()
+        if not sent:
+            time.sleep(0.3)
+        sent.append(started)
+        traffic.report(item, 200, started, None, reused=False)
+        if len(sent) == 4:
+            traffic.STOP.set()
+
+    monkeypatch.setattr(traffic, "send", stalling_send)
+    traffic.generate(0, 1, seed=None)
+    traffic.STATS.flush()
+
+    (summary,) = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert summary["count"] == 4
+    assert summary["p50_ms"] < 50
+    # One 300 ms answer at a 50 ms interval stands in for five more skipped sends.
+    assert summary["corrected_count"] >= 8
+    assert summary["corrected_p50_ms"] >= 50
+    assert summary["corrected_max_ms"] >= summary["max_ms"] >= 300
+    assert min(later - earlier for earlier, later in itertools.pairwise(sent[1:])) >= 0.04
+
+
+def test_corrected_samples_use_the_expected_interval(traffic) -> None:
+    assert traffic.corrected_samples(1000, 250) == [1000, 750, 500, 250]
+    assert traffic.corrected_samples(200, 250) == [200]
+    assert traffic.corrected_samples(1000, None) == [1000]
+
+
+def test_traffic_stages_parse_ramps_and_constant_arrivals(traffic) -> None:
+    stages = traffic.parse_stages("warm-up:2:0-4, steady:1:4", default_rate=1)
+
+    assert stages == [
+        traffic.Stage("warm-up", 2, 0, 4),
+        traffic.Stage("steady", 1, 4, 4),
+    ]
+    assert stages[0].rate(1) == 2
+    planned = list(traffic.arrivals(stages[1:], poisson=False, rng=traffic.random.Random(1)))
+    assert [stage for _offset, stage in planned] == ["steady"] * 3
+    assert [round(offset, 2) for offset, _stage in planned] == [0.25, 0.5, 0.75]
+
+
+def test_traffic_poisson_arrivals_hit_the_target_rate(traffic) -> None:
+    stages = traffic.parse_stages("steady:100:20", default_rate=1)
+    planned = list(traffic.arrivals(stages, poisson=True, rng=traffic.random.Random(7)))
+
+    assert 1900 < len(planned) < 2100
+    assert planned == sorted(planned)
+
+
+@pytest.mark.parametrize("engine", ("threads", "asyncio"))
+def test_open_loop_drops_arrivals_beyond_max_outstanding(traffic, capsys, engine) -> None:
+    release = threading.Event()
+    schedule = iter([(0.0, "spike")] * 5)
+    items = ({"n": index} for index in range(5))
+    sent = []
+
+    if engine == "threads":
+
+        def blocking_send(item: dict) -> None:
+            sent.append(item["n"])
+            release.wait(5)
+
+        threading.Timer(0.2, release.set).start()
+        traffic.open_loop_threads(schedule, items, 2, sender=blocking_send)
+    else:
+
+        async def slow_send(item: dict) -> None:
+            sent.append(item["n"])
+            await asyncio.sleep(0.05)
+
+        asyncio.run(traffic.open_loop_async(schedule, items, 2, sender=slow_send))
+
+    assert sorted(sent) == [0, 1]
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert summary == {"event": "banklab-traffic-stage", "stage": "spike", "sent": 2, "dropped": 3}
+
+
+def test_traffic_metrics_export_status_mismatches(traffic) -> None:
+    metrics = traffic.TrafficMetrics(window_seconds=60)
+    item = traffic_item()
+    metrics.record(item, 200, 0.02, 0.03)
+    metrics.record(item, 200, 0.02, 0.03)
+    metrics.record(item, 429, 0.2, 1.5)
+    metrics.record({**item, "scenario": "missing-credential", "expected": 401}, 401, 0.01, 0.01)
+
+    merged = traffic.TrafficMetrics(window_seconds=60)
+    merged.merge(metrics.snapshot())
+    merged.merge(metrics.snapshot())
+    httpd = traffic.serve_metrics(0, merged.render_prometheus)
+    try:
+        text = raw_get(
+            httpd.server_port, b"GET /metrics HTTP/1.1\r\nConnection: close\r\n\r\n"
+        ).decode()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    labels = 'client="test-client",api="cards",scenario="steady"'
+    assert f'banklab_traffic_requests_total{{{labels},expected="200",status="200"}} 4' in text
+    assert f'banklab_traffic_requests_total{{{labels},expected="200",status="429"}} 2' in text
+    assert f'banklab_traffic_request_duration_seconds_bucket{{{labels},le="0.025"}} 4' in text
+    assert f'banklab_traffic_corrected_duration_seconds_bucket{{{labels},le="1.0"}} 4' in text
+    assert f"banklab_traffic_request_duration_seconds_count{{{labels}}} 6" in text
+    assert f"banklab_traffic_mismatch_ratio{{{labels}}} 0.333333" in text
+    assert 'scenario="missing-credential"} 0.000000' in text
+
+
+def test_traffic_metrics_escape_label_values(traffic) -> None:
+    metrics = traffic.TrafficMetrics(window_seconds=60)
+    scenario = 'say "hi"\\now\nthen'
+    metrics.record({"client": "c", "api": "a", "scenario": scenario, "expected": 200}, 200, 0, 0)
+
+    text = metrics.render_prometheus().decode()
+
+    assert 'scenario="say \\"hi\\"\\\\now\\nthen"' in text
+
+
+def test_traffic_coordinator_keeps_a_worker_after_one_slow_reply(traffic, monkeypatch) -> None:
+    traffic.METRICS.record(traffic_item(), 200, 0.02, 0.03)
+    snapshot, stalls = traffic.METRICS.snapshot, [0.4]
+
+    def slow_once() -> dict:
+        if stalls:
+            time.sleep(stalls.pop())
+        return snapshot()
+
+    monkeypatch.setattr(traffic.METRICS, "snapshot", slow_once)
+    parent, child = socket.socketpair()
+    traffic.WorkerControl(child.detach())
+    coordinator = traffic.Coordinator(1, 1, control_timeout_seconds=0.2)
+    coordinator._workers.append((None, parent, bytearray()))
+    coordinator.metrics[0] = {"stale": True}
+
+    try:
+        coordinator.collect()
+        assert coordinator.metrics == {}
+        time.sleep(0.3)
+        coordinator.collect()
+        assert coordinator.metrics[0] == snapshot()
+        assert 'status="200"' in coordinator.render_prometheus().decode()
+    finally:
+        parent.close()
+
+
+@pytest.fixture
+def limiter():
+    """Kong-style per-consumer limiter: 4 requests per wall-clock second."""
+
+    class LimiterHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        windows: dict[tuple[str, int], int] = {}
+        statuses: list[int] = []
+
+        def log_message(self, *_args) -> None:
+            pass
+
+        def date_time_string(self, timestamp=None) -> str:
+            return super().date_time_string(self.now)
+
+        def do_GET(self) -> None:
+            self.now = time.time()
+            key = (self.headers.get("apikey", ""), int(self.now))
+            used = self.windows.get(key, 0)
+            status = 200 if used < 4 else 429
+            self.windows[key] = min(used + 1, 4)
+            self.statuses.append(status)
+            remaining = str(4 - self.windows[key])
+            self.send_response(status)
+            for name, value in (
+                ("RateLimit-Limit", "4"),
+                ("RateLimit-Remaining", remaining),
+                ("RateLimit-Reset", "1"),
+                ("X-RateLimit-Limit-Second", "4"),
+                ("X-RateLimit-Remaining-Second", remaining),
+                ("Content-Length", "0"),
+            ):
+                self.send_header(name, value)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), LimiterHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: bytes) -> None:
+        self.status = status
+        self.headers = http.client.parse_headers(io.BytesIO(headers + b"\r\n"))
+
+    def getheader(self, name: str, default: str | None = None) -> str | None:
+        return self.headers.get(name, default)
+
+
+def test_rate_pacer_follows_limit_headers_and_backs_off_on_429(traffic) -> None:
+    pacer = traffic.RatePacer(headroom=0.9, start_rate=1)
+    assert pacer.reserve("CARDS_API_KEY", 100.0) == 100.0
+    assert pacer.reserve("CARDS_API_KEY", 100.0) == 101.0
+
+    limited = b"RateLimit-Limit: 30\r\nRateLimit-Remaining: 12\r\nRateLimit-Reset: 40\r\n"
+    limited += b"X-RateLimit-Limit-Minute: 30\r\nX-RateLimit-Remaining-Minute: 12\r\n"
+    assert traffic.rate_limit(FakeResponse(200, limited).headers) == (30, 12, 40.0, 60)
+    pacer.observe("CARDS_API_KEY", FakeResponse(200, limited), 101.0)
+    assert pacer.rate("CARDS_API_KEY") == pytest.approx(0.45)
+
+    exhausted = b"RateLimit-Limit: 3\r\nRateLimit-Remaining: 0\r\nRateLimit-Reset: 1\r\n"
+    pacer.observe("ACCOUNTS_API_KEY", FakeResponse(200, exhausted), 50.0)
+    assert pacer.rate("ACCOUNTS_API_KEY") == pytest.approx(2.7)
+    assert pacer.reserve("ACCOUNTS_API_KEY", 50.0) == 51.0
+
+    pacer.observe("ACCOUNTS_API_KEY", FakeResponse(429, exhausted + b"Retry-After: 2\r\n"), 52.0)
+    assert pacer.rate("ACCOUNTS_API_KEY") == pytest.approx(1.35)
+    assert pacer.reserve("ACCOUNTS_API_KEY", 52.0) == 54.0
+    assert pacer.snapshot()["ACCOUNTS_API_KEY"] == {"rate": 1.35, "throttled": 1}
+    assert traffic.rate_limit(FakeResponse(401, b"").headers) is None
+
+
+def test_paced_traffic_stays_under_the_limit(traffic, monkeypatch, capsys) -> None:
+    # A simulated clock and a Kong-style limiter of 4 per second keep this exact.
+    now = 0.0
+    windows: dict[int, int] = {}
+    statuses = []
+
+    def wait(seconds: float) -> bool:
+        nonlocal now
+        now += seconds
+        return now >= 10
+
+    def limited_send(_item: dict) -> FakeResponse:
+        nonlocal now
+        now += 0.01
+        used = windows.get(int(now), 0)
+        status = 200 if used < 4 else 429
+        windows[int(now)] = min(used + 1, 4)
+        statuses.append(status)
+        remaining = 4 - windows[int(now)]
+        headers = (
+            f"RateLimit-Limit: 4\r\nRateLimit-Remaining: {remaining}\r\nRateLimit-Reset: 1\r\n"
+            f"X-RateLimit-Limit-Second: 4\r\nX-RateLimit-Remaining-Second: {remaining}\r\n"
+        )
+        retry = "Retry-After: 1\r\n" if status == 429 else ""
+        return FakeResponse(status, (headers + retry).encode())
+
+    monkeypatch.setattr(traffic, "send", limited_send)
+    steady = lambda counter, profile: traffic.event(1, profile)  # noqa: E731
+    traffic.paced(
+        traffic.PROFILES[:1],
+        steady,
+        traffic.RatePacer(headroom=0.9),
+        clock=lambda: now,
+        wait=wait,
+    )
+
+    assert 429 not in statuses
+    assert statuses.count(200) >= 20
+    assert max(windows.values()) == 4
+    pacing = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert pacing["consumers"]["ACCOUNTS_API_KEY"] == {"rate": 3.6, "throttled": 0}
+
+
+def test_rate_limit_probe_measures_enforcement_precision(traffic, limiter, monkeypatch) -> None:
+    monkeypatch.setattr(traffic, "PROXY", "127.0.0.1")
+    monkeypatch.setattr(traffic, "PROXY_PORT", limiter.server_port)
+    monkeypatch.setattr(traffic, "REQUEST_LOG", False)
+    result = traffic.probe(traffic.PROFILES[0], seconds=2.5, overload=2)
+
+    assert result["limit"] == 4
+    assert result["window_seconds"] == 1
+    assert result["windows"] >= 1
+    assert result["admitted_min"] == result["admitted_max"] == 4
+    assert result["overshoot_windows"] == result["early_reject_windows"] == 0
+    assert result["under_admitted_p50_ms"] is not None
+    assert result["rejected_p99_ms"] is not None
+
+
+def test_traffic_workers_split_profiles_and_rate(traffic) -> None:
+    shares = [traffic.worker_share(index, 2) for index in range(2)]
+    assert sorted(profile for profiles, _share in shares for profile in profiles) == sorted(
+        traffic.PROFILES
+    )
+    assert sum(share for _profiles, share in shares) == pytest.approx(1)
+    crowded = [traffic.worker_share(index, 7) for index in range(7)]
+    assert sum(share for _profiles, share in crowded) == pytest.approx(1)
+    assert crowded[6] == ((traffic.PROFILES[1],), 0.1)
+    assert crowded[1] == ((traffic.PROFILES[1],), 0.1)
+    assert crowded[2] == ((traffic.PROFILES[2],), 0.2)
+
+
+def test_traffic_coordinator_merges_workers_and_stops_on_sigterm(traffic, upstream) -> None:
+    metrics_port = free_port()
+    coordinator = subprocess.Popen(
+        [sys.executable, str(ROOT / "kubernetes/banklab/customer-web/app/traffic.py")],
+        env={
+            **os.environ,
+            "KONG_PROXY_HOST": "127.0.0.1",
+            "KONG_PROXY_PORT": str(upstream.server_port),
+            "TRAFFIC_WORKERS": "2",
+            "TRAFFIC_INTERVAL_SECONDS": "0.02",
+            "TRAFFIC_REQUEST_LOG": "false",
+            "TRAFFIC_SUMMARY_SECONDS": "0.5",
+            "TRAFFIC_METRICS_PORT": str(metrics_port),
+        },
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    time.sleep(1.5)
+    metrics = raw_get(metrics_port, b"GET /metrics HTTP/1.1\r\nConnection: close\r\n\r\n")
+    coordinator.send_signal(signal.SIGTERM)
+    output, _ = coordinator.communicate(timeout=15)
+
+    assert coordinator.returncode == 0
+    records = [json.loads(line) for line in output.splitlines()]
+    summaries = [record for record in records if record["event"] == "banklab-traffic-summary"]
+    assert {record["client"] for record in summaries} == {
+        profile[0] for profile in traffic.PROFILES
+    }
+    assert all(record["ok_ratio"] == 1 for record in summaries)
+    assert records[-1]["event"] == "banklab-traffic-credentials"
+    assert b'banklab_traffic_requests_total{client="fraud-platform"' in metrics
+    assert b'banklab_traffic_requests_total{client="mobile-banking"' in metrics
+
+
+def test_traffic_recording_leaves_out_secrets(traffic, upstream, monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(traffic, "PROXY", "127.0.0.1")
+    monkeypatch.setattr(traffic, "PROXY_PORT", upstream.server_port)
+    monkeypatch.setattr(traffic, "REQUEST_LOG", False)
+    monkeypatch.setattr(traffic, "RECORDER", traffic.EventRecorder(str(tmp_path / "run.jsonl")))
+
+    traffic.send(traffic.event(1, traffic.PROFILES[2]))
+    traffic.send(traffic.event(97, traffic.PROFILES[0]))
+
+    text = (tmp_path / "run.jsonl").read_text()
+    assert "test-key" not in text
+    assert "Bearer" not in text
+    assert "traffic-" not in text
+    steady, partner = traffic.load_recording(str(tmp_path / "run.jsonl"))
+    assert (steady["credential"], steady["status"], steady["ok"]) == ("CARDS_API_KEY", 200, True)
+    assert partner["credential"] == "jwt"
+    assert set(partner["headers"]) == {"Host", "User-Agent"}
+    assert steady["t"] <= partner["t"]
+
+
+@pytest.mark.parametrize("timed", (True, False))
+def test_traffic_replay_resends_and_records_in_the_same_format(
+    traffic, upstream, monkeypatch, tmp_path, timed: bool
+) -> None:
+    monkeypatch.setattr(traffic, "PROXY", "127.0.0.1")
+    monkeypatch.setattr(traffic, "PROXY_PORT", upstream.server_port)
+    monkeypatch.setattr(traffic, "REQUEST_LOG", False)
+    original = tmp_path / "original.jsonl"
+    original.write_text(
+        "".join(
+            json.dumps(
+                {
+                    "t": offset,
+                    "client": "internet-banking",
+                    "api": "cards",
+                    "path": "/cards/v1/cards",
+                    "scenario": scenario,
+                    "credential": credential,
+                    "headers": {"Host": "api.internal.banklab.test"},
+                    "expected": expected,
+                    "status": expected,
+                    "ok": True,
+                    "latency_ms": 3.0,
+                    "corrected_latency_ms": 3.0,
+                    "error": None,
+                }
+            )
+            + "\n"
+            for offset, scenario, credential, expected in (
+                (2.0, "missing-credential", None, 401),
+                (1.0, "steady", "CARDS_API_KEY", 200),
+            )
+        )
+    )
+    monkeypatch.setattr(traffic, "RECORDER", traffic.EventRecorder(str(tmp_path / "replay.jsonl")))
+
+    started = time.monotonic()
+    traffic.replay(traffic.load_recording(str(original)), speed=10, timed=timed)
+
+    assert time.monotonic() - started < 1
+    replayed = traffic.load_recording(str(tmp_path / "replay.jsonl"))
+    before = traffic.load_recording(str(original))
+    assert [record["scenario"] for record in replayed] == ["steady", "missing-credential"]
+    assert [record["ok"] for record in replayed] == [True, True]
+    assert all(set(record) == set(before[0]) for record in replayed)
+    if timed:
+        assert 0.08 <= replayed[1]["t"] - replayed[0]["t"] < 0.5
+
+
 def test_customer_page_has_no_development_goal_language() -> None:
     app_dir = ROOT / "kubernetes/banklab/customer-web/app"
     page = (app_dir / "index.html").read_text().lower()
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import threading
+import time
+
+import pytest
+from conftest import ROOT
+
+EXPORTER = (
+    ROOT / "playbooks/argocd/applications/observability/domain-health/domain-health-exporter.py"
+)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    monkeypatch.setenv("DOMAIN_NAME", "example.test")
+    monkeypatch.setenv("CLOUDFLARE_API_TOKEN", "token")
+    monkeypatch.setenv("HEALTHCHECKS_PING_URL", "http://127.0.0.1:9/ping")
+    monkeypatch.setenv("EXPECTED_NAMESERVERS", "ada.ns.example,bob.ns.example")
+    spec = importlib.util.spec_from_file_location("domain_health_exporter", EXPORTER)
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader
+    spec.loader.exec_module(module)
+    return module
+
+
+def metric(exporter, name: str, check: str, domain: str = "example.test") -> float:
+    return exporter.STATE._samples[(name, (("check", check), ("domain", domain)))]
+
+
+def watched(exporter, name: str = "example.test", interval: int = 60):
+    return exporter.Domain(name, interval, ["ada.ns.example", "bob.ns.example"])
+
+
+def test_sources_are_fetched_concurrently_and_record_durations(exporter) -> None:
+    def slow(domain, timeout):
+        time.sleep(0.3)
+        return {}
+
+    def broken(domain, timeout):
+        raise RuntimeError("registry said no")
+
+    def passes(domain, now_ts, *payloads):
+        pass
+
+    checks = {name: ((name,), passes) for name in ("a", "b", "c", "d")}
+    sources = {"a": slow, "b": slow, "c": slow, "d": broken}
+    started = time.monotonic()
+    ok = exporter.run_checks(watched(exporter), checks, sources, time.time())
+    elapsed = time.monotonic() - started
+
+    assert not ok
+    assert elapsed < 0.6
+    assert metric(exporter, "domain_health_check_success", "a") == 1
+    assert metric(exporter, "domain_health_check_success", "d") == 0
+    assert 0.3 <= metric(exporter, "domain_health_check_duration_seconds", "c") < 0.6
+    assert metric(exporter, "domain_health_check_duration_seconds", "d") < 0.1
+    assert b'domain_health_check_duration_seconds{check="overall"' in (
+        exporter.STATE.render_prometheus()
+    )
+
+
+def test_slow_sources_fail_at_their_deadline_within_the_run_budget(exporter, monkeypatch) -> None:
+    monkeypatch.setattr(exporter, "CHECK_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(exporter, "RUN_BUDGET_SECONDS", 0.1)
+    release = threading.Event()
+    timeouts = []
+
+    def hung(domain, timeout):
+        timeouts.append(timeout)
+        release.wait(5)
+
+    def quick(domain, timeout):
+        timeouts.append(timeout)
+        return {}
+
+    checks = {name: ((name,), lambda domain, now_ts, payload: None) for name in ("hung", "quick")}
+    started = time.monotonic()
+    ok = exporter.run_checks(watched(exporter), checks, {"hung": hung, "quick": quick}, time.time())
+    elapsed = time.monotonic() - started
+    release.set()
+
+    assert not ok
+    assert elapsed < 0.5
+    assert max(timeouts) <= 0.1
+    assert metric(exporter, "domain_health_check_success", "hung") == 0
+    assert metric(exporter, "domain_health_check_success", "quick") == 1
+    assert metric(exporter, "domain_health_check_success", "overall") == 0
+    assert 0.09 <= metric(exporter, "domain_health_check_duration_seconds", "hung") < 0.5
+
+
+def test_cloudflare_zone_list_is_fetched_once_for_both_checks(exporter, monkeypatch) -> None:
+    calls = []
+    zones = {
+        "success": True,
+        "result": [
+            {
+                "name": "example.test",
+                "status": "active",
+                "name_servers": ["Bob.ns.example.", "ada.ns.example"],
+            }
+        ],
+    }
+
+    def request_json(url, headers=None, timeout=None):
+        calls.append(url)
+        if "cloudflare" in url:
+            return zones
+        if "rdap" in url:
+            return {"events": [{"eventAction": "expiration", "eventDate": "2030-01-01T00:00:00Z"}]}
+        return {"Answer": [{"data": "ada.ns.example."}]}
+
+    monkeypatch.setattr(exporter, "request_json", request_json)
+    ok = exporter.run_checks(watched(exporter), exporter.CHECKS, exporter.SOURCES, time.time())
+
+    assert ok
+    assert len(calls) == 3
+    assert sum("cloudflare" in url for url in calls) == 1
+    labels = (("domain", "example.test"),)
+    samples = exporter.STATE._samples
+    assert samples[("domain_health_cloudflare_zone_active", labels)] == 1
+    assert samples[("domain_health_cloudflare_nameservers_match", labels)] == 1
+    assert samples[("domain_health_public_dns_nameservers_match", labels)] == 0
+
+
+def test_a_failed_source_fails_only_the_checks_that_need_it(exporter, monkeypatch) -> None:
+    def request_json(url, headers=None, timeout=None):
+        if "cloudflare" in url:
+            return {"success": False, "errors": ["bad token"]}
+        if "rdap" in url:
+            return {"expirationDate": "2030-01-01T00:00:00Z"}
+        return {"Answer": [{"data": "ada.ns.example"}, {"data": "bob.ns.example"}]}
+
+    monkeypatch.setattr(exporter, "request_json", request_json)
+    assert not exporter.run_checks(
+        watched(exporter), exporter.CHECKS, exporter.SOURCES, time.time()
+    )
+
+    assert metric(exporter, "domain_health_check_success", "cloudflare_zone") == 0
+    assert metric(exporter, "domain_health_check_success", "cloudflare_nameservers") == 0
+    assert metric(exporter, "domain_health_check_success", "rdap") == 1
+    assert metric(exporter, "domain_health_check_success", "public_dns_nameservers") == 1
+
+
+def test_domains_file_sets_per_domain_intervals_and_nameservers(
+    exporter, monkeypatch, tmp_path
+) -> None:
+    domains_file = tmp_path / "domains.json"
+    domains_file.write_text(
+        json.dumps(
+            {
+                "domains": [
+                    {"name": "Example.test.", "expected_nameservers": ["B.ns.example.", "a.ns"]},
+                    {
+                        "name": "other.test",
+                        "interval_seconds": 600,
+                        "expected_nameservers": ["c.ns"],
+                        "healthchecks_ping_url": "http://127.0.0.1:9/other",
+                    },
+                ]
+            }
+        )
+    )
+    monkeypatch.setattr(exporter, "DOMAINS_FILE", str(domains_file))
+    first, second = exporter.load_domains()
+
+    assert (first.name, first.interval, first.expected_nameservers) == (
+        "example.test",
+        21600,
+        ["a.ns", "b.ns.example"],
+    )
+    assert first.ping_url == "http://127.0.0.1:9/ping"
+    assert (second.interval, second.ping_url) == (600, "http://127.0.0.1:9/other")
+
+    domains_file.write_text(
+        json.dumps({"domains": [{"name": "a.test", "expected_nameservers": ["x"]}] * 2})
+    )
+    with pytest.raises(RuntimeError, match="more than once"):
+        exporter.load_domains()
+
+
+def test_scheduler_limits_concurrency_and_labels_every_domain(exporter, monkeypatch) -> None:
+    def request_json(url, headers=None, timeout=None):
+        time.sleep(0.02)
+        name = url.split("name=")[-1].split("&")[0] if "name=" in url else url.rsplit("/", 1)[-1]
+        if "cloudflare" in url:
+            return {"success": True, "result": [{"name": name, "status": "active"}]}
+        if "rdap" in url:
+            return {"expirationDate": "2030-01-01T00:00:00Z"}
+        return {"Answer": [{"data": "ada.ns.example"}, {"data": "bob.ns.example"}]}
+
+    monkeypatch.setattr(exporter, "request_json", request_json)
+    domains = [watched(exporter, f"zone{index}.test", interval=0.2) for index in range(6)]
+    exporter.STATE.watch(domains)
+    assert exporter.STATE.get_health()
+    assert not exporter.STATE.get_ready()
+
+    active, peak, runs = 0, 0, {}
+    lock = threading.Lock()
+
+    def run(domain):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+            runs[domain.name] = runs.get(domain.name, 0) + 1
+        try:
+            exporter.run_domain(domain)
+        finally:
+            with lock:
+                active -= 1
+
+    stop = threading.Event()
+    scheduler = exporter.Scheduler(domains, run, concurrency=2, jitter_seconds=0.1)
+    thread = threading.Thread(target=scheduler.run_forever, args=(stop,))
+    thread.start()
+    time.sleep(0.9)
+    stop.set()
+    thread.join(5)
+
+    assert peak == 2
+    assert all(runs.get(domain.name, 0) >= 2 for domain in domains)
+    assert exporter.STATE.get_health()
+    assert exporter.STATE.get_ready()
+    for domain in domains:
+        assert metric(exporter, "domain_health_check_success", "overall", domain.name) == 1
+
+
+def test_liveness_follows_scheduler_progress_not_check_results(exporter, monkeypatch) -> None:
+    def broken(domain, timeout):
+        raise RuntimeError("registry said no")
+
+    monkeypatch.setattr(exporter, "SOURCES", {name: broken for name in exporter.SOURCES})
+    domain = watched(exporter, interval=0.1)
+    domain.ping_url = ""
+    exporter.STATE.watch([domain])
+    exporter.run_domain(domain)
+
+    assert metric(exporter, "domain_health_check_success", "overall") == 0
+    assert exporter.STATE.get_health()
+    assert exporter.STATE.get_ready()
+
+    time.sleep(0.25)
+    assert not exporter.STATE.get_health()
+    assert exporter.STATE.get_ready()
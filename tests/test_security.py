@@ -31,7 +31,7 @@ def test_each_tenant_has_four_request_plugins() -> None:
 def test_synthetic_consumers_reference_credentials_by_name() -> None:
     resources = load_all("kubernetes/banklab/security/security-controls.yaml")
     consumers = [resource for resource in resources if resource["kind"] == "KongConsumer"]
-    assert len(consumers) == 6
+    assert len(consumers) == 7
     assert all(consumer.get("credentials") for consumer in consumers)
 
 